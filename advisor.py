@@ -0,0 +1,279 @@
+import argparse
+import itertools
+import sqlite3
+import time
+
+import benchmark
+import snapshots
+import stats
+
+#--------------------------------------------------------
+#                      INDEX ADVISOR
+#--------------------------------------------------------
+#Suggests indexes for a declared query instead of hand-picking them as the
+#UserOptimized scenarios do. The columns the query reads are found with an
+#authorizer callback while it is prepared, candidate indexes are built from
+#them, and every candidate is benchmarked as its own scenario on a snapshot
+#against a baseline with no extra index (automatic indexing on, as in
+#SelfOptimized). Each candidate is reported with
+#   gain       - baseline median / candidate median, shown only when a
+#                Mann-Whitney U test finds the two latency samples differ;
+#                otherwise "no measurable difference"
+#   build      - seconds to CREATE INDEX on the snapshot
+#   size       - bytes of the index, from dbstat
+#   write cost - time to delete rows from its table with the index, over the
+#                time without it (each extra index is one more b-tree to
+#                update on every write)
+#   score      - gain / write cost (a write cost below 1 counts as 1), the
+#                read speedup bought per unit of extra write work
+#Candidates are ranked by
+#   1. used by the planner - unused ones are kept in the report, marked, but
+#      whatever gain they show is noise, as their plan is the baseline's
+#   2. a measurable difference from the baseline
+#   3. score, to one decimal
+#   4. build time, to a hundredth of a second, then size
+#and the recommendation takes the first used, measurable candidate of each
+#table whose gain is at least MIN_GAIN.
+
+#Largest composite index tried; every ordering of up to this many referenced
+#columns is a candidate, beyond it only each column first with the rest after
+MAX_COLUMNS = 3
+
+#Rows deleted (and rolled back) to measure write cost, and how many times
+WRITE_ROWS = 1000
+WRITE_REPEATS = 5
+
+#A candidate must beat the baseline by this factor to be recommended
+MIN_GAIN = 1.1
+
+#p-value below which a candidate's latencies differ measurably from the
+#baseline's
+SIGNIFICANCE = 0.05
+
+DEFAULT_RUNS = 20
+
+#Returns {table: [column, ...]} for every table column the query reads, in
+#table order. Views in the query's setup are expanded to their tables.
+def referenced_columns(uri, sql, params):
+    connection = sqlite3.connect(uri, uri=True)
+    read = {}
+
+    def authorizer(action, table, column, database, trigger):
+        if action == sqlite3.SQLITE_READ and column:
+            read.setdefault(table, set()).add(column)
+        return sqlite3.SQLITE_OK
+
+    try:
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        connection.set_authorizer(authorizer)
+        #Preparing is enough for the authorizer to see every column
+        connection.execute("EXPLAIN " + sql, params).fetchall()
+        connection.set_authorizer(None)
+        columns = {}
+        for table in sorted(read):
+            if table in tables:
+                order = [row[1] for row in connection.execute('PRAGMA table_info("{}")'.format(table))]
+                columns[table] = [name for name in order if name in read[table]]
+        return columns
+    finally:
+        connection.close()
+
+#Column lists of the indexes a table already has, including the ones SQLite
+#creates for its primary key
+def existing_indexes(connection, table):
+    indexes = []
+    for row in connection.execute('PRAGMA index_list("{}")'.format(table)):
+        indexes.append([info[2] for info in connection.execute('PRAGMA index_info("{}")'.format(row[1]))])
+    return indexes
+
+#Candidate column lists for one table: single columns, then composites, with
+#any the table already has an index starting with left out
+def candidates(columns, existing):
+    orders = []
+    for size in range(1, min(len(columns), MAX_COLUMNS) + 1):
+        orders += [list(order) for order in itertools.permutations(columns, size)]
+    if len(columns) > MAX_COLUMNS:
+        orders += [[first] + [c for c in columns if c != first] for first in columns]
+    return [order for order in orders if not any(index[:len(order)] == order for index in existing)]
+
+def index_name(table, columns):
+    return "advise_{}_{}".format(table, "_".join(columns))
+
+#Bytes used by one table or index of a snapshot
+def object_size(uri, name):
+    connection = sqlite3.connect(uri, uri=True)
+    try:
+        return connection.execute("SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = ?", (name,)).fetchone()[0]
+    finally:
+        connection.close()
+
+#Median seconds to delete rows rows from a table of a snapshot. The delete
+#is rolled back every time, so the snapshot is left as it was; foreign keys
+#are off so only the table and its own indexes are measured.
+def write_cost(uri, table, rows=WRITE_ROWS, repeats=WRITE_REPEATS):
+    connection = sqlite3.connect(uri, uri=True)
+    connection.isolation_level = None
+    times = []
+    try:
+        connection.execute("PRAGMA foreign_keys=OFF")
+        for i in range(repeats):
+            connection.execute("BEGIN")
+            start = time.perf_counter_ns()
+            connection.execute('DELETE FROM "{0}" WHERE rowid IN (SELECT rowid FROM "{0}" LIMIT ?)'.format(table),
+                               (rows,))
+            times.append(time.perf_counter_ns() - start)
+            connection.execute("ROLLBACK")
+    finally:
+        connection.close()
+    return stats.median(times) / 1e9
+
+#Benchmarks every candidate index for query on the database at path and
+#returns {"baseline": result, "candidates": [...], "recommended": result or
+#None}, candidates used by the planner first, then those with a measurable
+#difference, each group by gain. Each candidate is
+#   {"table", "columns", "name", "result", "used", "gain", "p", "measurable",
+#    "build_seconds", "size", "write_cost", "write_amplification", "score"}
+def advise(query, path, runs=DEFAULT_RUNS, options=None):
+    options = benchmark.make_options(options)
+    pragmas = {"automatic_index": "ON"}
+
+    #Columns are found on a snapshot with the query's own setup (e.g. a view)
+    uri = snapshots.snapshot(path, query["setup"], options["snapshot"])
+    connection = sqlite3.connect(uri, uri=True)
+    try:
+        params = query["sampler"](connection.cursor(), 1, **options["sampling"])[0]
+    finally:
+        connection.close()
+    columns = referenced_columns(uri, query["sql"], params)
+
+    connection = sqlite3.connect(uri, uri=True)
+    try:
+        proposed = [(table, order) for table in columns
+                    for order in candidates(columns[table], existing_indexes(connection, table))]
+    finally:
+        connection.close()
+
+    def index_statement(table, order):
+        return "CREATE INDEX {} ON {} ({})".format(index_name(table, order), table, ", ".join(order))
+
+    #One scenario per candidate, all measured with the same parameters
+    scenarios = {"Baseline": benchmark.scenario(pragmas=pragmas)}
+    for table, order in proposed:
+        scenarios[index_name(table, order)] = benchmark.scenario(
+            pragmas=pragmas, setup=[index_statement(table, order)],
+            expect={"require": ["INDEX {} ".format(index_name(table, order))]})
+    advisory = dict(query, scenarios=scenarios)
+    results = benchmark.run([advisory], [path], list(scenarios), runs, options)
+    byScenario = {result["scenario"]: result for result in results}
+    baseline = byScenario["Baseline"]
+    baselineMedian = baseline["summary"]["median"]
+
+    #Write cost of each table as it is, to compare the candidates against
+    baseWrite = {table: write_cost(uri, table) for table in columns}
+
+    report = []
+    for table, order in proposed:
+        name = index_name(table, order)
+        result = byScenario[name]
+        indexURI = snapshots.snapshot(path, [index_statement(table, order)] + query["setup"], options["snapshot"])
+        build = [r for r in snapshots.build_reports(indexURI) if "statement" in r and name in r["statement"]]
+        cost = write_cost(indexURI, table)
+        _, p = stats.mann_whitney(baseline["times"], result["times"])
+        report.append({
+            "table": table,
+            "columns": order,
+            "name": name,
+            "result": result,
+            "used": not result["plan_problems"],
+            "gain": baselineMedian / max(result["summary"]["median"], 1),
+            "p": p,
+            "measurable": p < SIGNIFICANCE,
+            "build_seconds": build[0]["seconds"] if build else 0.0,
+            "size": object_size(indexURI, name),
+            "write_cost": cost,
+            "write_amplification": cost / baseWrite[table] if baseWrite[table] > 0 else 0.0,
+        })
+    #Used and measurable candidates first, then most gain per unit of write
+    #cost; between equal scores the quicker build, then the smaller index
+    for candidate in report:
+        candidate["score"] = candidate["gain"] / max(candidate["write_amplification"], 1.0)
+    report.sort(key=lambda c: (not c["used"], not c["measurable"], -round(c["score"], 1),
+                               round(c["build_seconds"], 2), c["size"]))
+
+    #The best used candidate of each table, measured together, since the
+    #gains of indexes on different tables of a join do not simply add up
+    chosen = {}
+    for candidate in report:
+        if candidate["used"] and candidate["measurable"] and candidate["gain"] >= MIN_GAIN \
+                and candidate["table"] not in chosen:
+            chosen[candidate["table"]] = candidate
+    recommended = None
+    if chosen:
+        advisory["scenarios"] = {"Recommended": benchmark.scenario(
+            pragmas=pragmas, setup=[index_statement(c["table"], c["columns"]) for c in chosen.values()],
+            expect={"require": ["INDEX {} ".format(c["name"]) for c in chosen.values()]})}
+        recommended = benchmark.run([advisory], [path], ["Recommended"], runs, options)[0]
+        recommended["indexes"] = [index_statement(c["table"], c["columns"]) for c in chosen.values()]
+
+    return {"baseline": baseline, "candidates": report, "recommended": recommended}
+
+def print_advice(query, path, advice):
+    baseline = advice["baseline"]["summary"]["median"]
+    print("\nIndex advice for {} on {} (baseline median {:.4f} ms, automatic indexing on)".format(
+        query["name"], path, baseline / 1e6))
+    print("{:<58} {:>9} {:>7} {:>9} {:>10} {:>7} {:>7}".format(
+        "candidate", "median", "gain", "build s", "size KiB", "writes", "score"))
+    for c in advice["candidates"]:
+        label = "{} ({})".format(c["table"], ", ".join(c["columns"]))
+        notes = []
+        if not c["used"]:
+            notes.append("unused by the planner")
+        if not c["measurable"]:
+            notes.append("no measurable difference, p = {:.2f}".format(c["p"]))
+        print("{:<58} {:>9.4f} {:>7} {:>9.3f} {:>10.1f} {:>6.2f}x {:>7}{}".format(
+            label, c["result"]["summary"]["median"] / 1e6,
+            "{:.1f}x".format(c["gain"]) if c["measurable"] else "-", c["build_seconds"],
+            c["size"] / 1024, c["write_amplification"], "{:.1f}".format(c["score"]) if c["measurable"] else "-",
+            "  ({})".format("; ".join(notes)) if notes else ""))
+    print("median in ms; gain only where a Mann-Whitney U test against the baseline gives p < {};"
+          " writes is the time to delete {} rows of the table with the index over the time without it;"
+          " score is gain / writes, the ranking key".format(SIGNIFICANCE, WRITE_ROWS))
+
+    recommended = advice["recommended"]
+    if recommended is None:
+        print("\nNo candidate used by the planner measurably beats the baseline by {:.1f}x;"
+              " no index recommended".format(MIN_GAIN))
+        return
+    _, p = stats.mann_whitney(advice["baseline"]["times"], recommended["times"])
+    print("\nRecommended ({:.4f} ms, {}):".format(
+        recommended["summary"]["median"] / 1e6,
+        "{:.1f}x".format(baseline / max(recommended["summary"]["median"], 1)) if p < SIGNIFICANCE
+        else "no measurable difference together, p = {:.2f}".format(p)))
+    for statement in recommended["indexes"]:
+        print("    " + statement + ";")
+    for problem in recommended["plan_problems"]:
+        print("    ! " + problem)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suggest indexes for the assignment queries")
+    parser.add_argument("--query", action="append", help="query name, e.g. Q1 (default: all)")
+    parser.add_argument("--db", default="./A3Small.db", help="database to advise on")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--jobs", type=int, default=benchmark.DEFAULT_OPTIONS["jobs"],
+                        help="benchmark this many candidates at once in a process pool")
+    args = parser.parse_args(argv)
+
+    queries = benchmark.load_queries()
+    names = args.query or list(queries)
+    for name in names:
+        if name not in queries:
+            parser.error("unknown query {} (known: {})".format(name, ", ".join(queries)))
+
+    for name in names:
+        advice = advise(queries[name], args.db, args.runs, {"jobs": args.jobs})
+        print_advice(queries[name], args.db, advice)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,726 @@
+import argparse
+import contextlib
+import importlib
+from array import array
+import os
+import sqlite3
+import time
+
+import instrument
+import plans
+import resultcache
+import samplers
+import snapshots
+import stats
+import variants
+
+#--------------------------------------------------------
+#                      OVERVIEW
+#--------------------------------------------------------
+#Shared benchmark engine for the QnA3.py drivers. Each driver declares its
+#query as data (see make_query) and this module does the connecting, the
+#scenario setup, the timed loop and the result collection, so every query is
+#measured the same way. Scenarios are applied to snapshots of the databases
+#(see snapshots.py); the .db files themselves are never modified.
+#
+#A result is a plain dict:
+#   {"query": "Q1", "db": "./A3Small.db", "scenario": "Uninformed",
+#    "timing": "full", "comparable": True, "cache": "hot", "warmup": 5,
+#    "snapshot": "file", "build": [variants.build_unkeyed() reports],
+#    "plan": [EXPLAIN QUERY PLAN lines], "plan_problems": [...],
+#    "os_evicted": False, "result_cache": None or resultcache.cache_stats(),
+#    "columnar": None or load time and size of the copy (see columnar.py),
+#    "instrumentation": None or VM steps, statements and pages per run
+#                       (see instrument.py),
+#    "runs": 50, "convergence": None or how an adaptive cell stopped
+#                                (see timed_runs),
+#    "times": array('q', [wall ns, ...]), "cpu_times": array('q', [cpu ns, ...]),
+#    "summary": stats.summarize(times), "cpu_summary": stats.summarize(cpu_times)}
+#Every run is kept so the report can show the tail, not just an average.
+
+#--------------------------------------------------------
+#                      DEFAULTS
+#--------------------------------------------------------
+
+#Modules that declare a QUERY; adding a query means adding its module here
+QUERY_MODULES = ["Q1A3", "Q2A3", "Q3A3", "Q4A3"]
+
+#All the databases we want to run on
+DEFAULT_PATHS = ["./A3Small.db", "./A3Medium.db", "./A3Large.db"]
+
+#All the scenarios we want to run, in order
+DEFAULT_SCENARIOS = ["Uninformed", "SelfOptimized", "UserOptimized", "Cached"]
+
+DEFAULT_RUNS = 50
+
+#Adaptive run count (see timed_runs): keep timing until the median's CI is
+#narrower than target (relative to the median) or the budget runs out
+#   target   - relative width of the 95% CI of the median to stop at
+#   budget   - seconds of timed runs allowed per cell
+#   min_runs - runs taken before convergence is first checked
+#   max_runs - runs never exceeded, however wide the CI
+#   pool     - parameters sampled per database; runs cycle through them
+ADAPTIVE_SETTINGS = {
+    "target": 0.05,
+    "budget": 10.0,
+    "min_runs": 20,
+    "max_runs": 100000,
+    "pool": 1000,
+}
+
+#How a run is timed
+#   full    - execute plus fetching every row, on the monotonic wall clock,
+#             with process CPU time recorded alongside
+#   execute - cursor.execute() alone, as the original Q2A3/Q3A3 did. sqlite3
+#             steps the statement to its first row there, which for the
+#             single-row aggregates here is nearly all the work; what it
+#             leaves out is converting the row to Python objects and stepping
+#             past it, and for a query returning many rows, every row after
+#             the first. Its numbers are flagged as not comparable with full
+#             ones
+TIMING_MODES = ["full", "execute"]
+
+#State of the caches when a run starts
+#   hot  - a few discarded warm-up executions are run first
+#   cold - before every run SQLite's page cache is shrunk and the snapshot
+#          file is evicted from the OS page cache (where posix_fadvise exists)
+CACHE_MODES = ["hot", "cold"]
+
+#Options shared by every cell of a run; see make_options()
+DEFAULT_OPTIONS = {
+    "timing": "full",
+    "cache": "hot",
+    "warmup": 5,
+    "snapshot": "file",
+    #Size of each connection's prepared statement cache; the timed loop
+    #reuses one SQL string, so its statement is prepared once and then
+    #reset and rebound. 0 re-prepares on every execute, to show that cost.
+    "cached_statements": 16,
+    #Run all sampled parameters in one statement (see batch_statement)
+    "batch": False,
+    #How many times a batch is repeated; each repeat is one sample
+    "batch_repeats": 10,
+    #Overrides passed to every sampler, e.g. {"distribution": "zipf", "seed": 1}
+    #(see samplers.DEFAULT_SAMPLING)
+    "sampling": {},
+    #Cells run at once in a process pool (see parallel.py); 1 runs in-process
+    "jobs": 1,
+    #Pin each worker to one CPU where os.sched_setaffinity exists
+    "pin": False,
+    #Let cells set up concurrently but only one time its runs at a time
+    "serialize_timing": False,
+    #After the timed runs, run every parameter again untimed with VM step
+    #counting and statement tracing attached (see instrument.py)
+    "instrument": False,
+    #None times every sampled parameter once; otherwise a dict of
+    #ADAPTIVE_SETTINGS overrides ({} for the defaults)
+    "adaptive": None,
+}
+
+#Held around the timed phase of a cell when set; parallel.py installs a
+#lock shared by all workers here for serialize_timing
+TIMING_LOCK = None
+
+#--------------------------------------------------------
+#                  QUERY DECLARATIONS
+#--------------------------------------------------------
+
+#Builds the declaration of a query
+#   name      - short name used in reports, e.g. "Q1"
+#   sql       - the query text, using named parameters
+#   sampler   - function(cursor, count, **sampling) -> list of parameter
+#               dicts, usually from samplers.column_sampler
+#   scenarios - dict of scenario name -> scenario dict (see scenario())
+#   setup     - statements applied to every scenario's snapshot, e.g. a view
+#   batch_sql - optional form of sql answering every parameter at once; it
+#               reads them from a Params(id, <param names>) table and
+#               returns one row per id, with the same answer sql gives for
+#               parameters that match nothing, so it joins Params with LEFT
+#               JOIN (see batch_statement)
+#   readonly  - the query never writes, so it runs with query_only set and
+#               is never committed
+def make_query(name, sql, sampler, scenarios, setup=(), batch_sql=None, readonly=True):
+    return {
+        "name": name,
+        "sql": sql,
+        "sampler": sampler,
+        "scenarios": scenarios,
+        "setup": list(setup),
+        "batch_sql": batch_sql,
+        "readonly": readonly,
+    }
+
+#Builds one scenario: pragmas to set on every connection, tables to rebuild
+#without keys ({table: [(column, type), ...]}), and DDL applied afterwards.
+#The rebuild and the DDL happen once, when the scenario's snapshot is built.
+#expect describes the query plan the scenario should produce (see plans.py).
+#cache puts a result cache in front of the query, with settings as in
+#resultcache.DEFAULT_SETTINGS. engine "columnar" answers the query from a
+#NumPy copy of the tables instead of SQLite (see columnar.py). sql and
+#batch_sql replace the query's own, for scenarios that answer it from
+#another structure, e.g. a summary table.
+def scenario(pragmas=None, setup=(), unkeyed=None, expect=None, cache=None, engine=None, sql=None,
+             batch_sql=None):
+    return {
+        "pragmas": dict(pragmas or {}),
+        "setup": list(setup),
+        "unkeyed": dict(unkeyed or {}),
+        "expect": dict(expect or {}),
+        "cache": dict(cache) if cache is not None else None,
+        "engine": engine,
+        "sql": sql,
+        "batch_sql": batch_sql,
+    }
+
+#Builds the three assignment scenarios for a query, Cached: UserOptimized
+#behind a result cache, and Columnar: the query run on NumPy arrays
+#   tables  - dict of table name -> [(column, type), ...] to copy without keys
+#             for the Uninformed scenario
+#   indexes - dict of index name -> "Table (col, col)" for UserOptimized
+def standard_scenarios(tables, indexes):
+    userOptimized = {
+        "pragmas": {"automatic_index": "ON"},
+        "setup": ["CREATE INDEX {} ON {}".format(name, on) for name, on in indexes.items()],
+        "expect": {"require": ["INDEX {} ".format(name) for name in indexes]},
+    }
+    return {
+        "Uninformed": scenario(
+            pragmas={"automatic_index": "OFF"},
+            unkeyed=tables,
+            expect={"forbid": ["AUTOMATIC"]},
+        ),
+        "SelfOptimized": scenario(pragmas={"automatic_index": "ON"}),
+        "UserOptimized": scenario(**userOptimized),
+        "Cached": scenario(cache=resultcache.DEFAULT_SETTINGS, **userOptimized),
+        "Columnar": scenario(engine="columnar"),
+    }
+
+#Imports every module in QUERY_MODULES and returns their queries by name
+def load_queries(modules=QUERY_MODULES):
+    queries = {}
+    for module in modules:
+        query = importlib.import_module(module).QUERY
+        queries[query["name"]] = query
+    return queries
+
+#Describes every scenario name some of queries do not declare, e.g.
+#"Summary (not declared by Q4)"; Materialized, Summary and Precomputed only
+#exist for some queries
+def undeclared_scenarios(queries, scenarios):
+    problems = []
+    for scenarioName in scenarios:
+        missing = [query["name"] for query in queries if scenarioName not in query["scenarios"]]
+        if missing:
+            problems.append("{} (not declared by {})".format(scenarioName, ", ".join(missing)))
+    return problems
+
+#--------------------------------------------------------
+#                      EXECUTION
+#--------------------------------------------------------
+
+#Connects to a database path, or to a snapshot URI when uri is True
+def connect(path, uri=False, cachedStatements=DEFAULT_OPTIONS["cached_statements"]):
+    connection = sqlite3.connect(path, uri=uri, cached_statements=cachedStatements)
+    connection.execute(" PRAGMA foreign_keys=ON; ")
+    connection.commit()
+    return connection
+
+#Returns the statement and positional arguments that run query's batch_sql
+#for every parameter dict in params, which are supplied as a VALUES list
+#named Params(id, ...) so nothing has to be written to the database
+def batch_statement(query, params):
+    if not query["batch_sql"]:
+        raise ValueError("query {} has no batch_sql".format(query["name"]))
+    names = list(params[0])
+    row = "(" + ", ".join("?" * (len(names) + 1)) + ")"
+    sql = "WITH Params(id, {}) AS (VALUES {})\n{}".format(
+        ", ".join(names), ", ".join([row] * len(params)), query["batch_sql"])
+    args = []
+    for i, p in enumerate(params):
+        args.append(i)
+        args += [p[name] for name in names]
+    return sql, args
+
+def set_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute("PRAGMA {}={}".format(name, value))
+
+#Fills in the defaults for anything not set in options
+def make_options(options=None):
+    merged = dict(DEFAULT_OPTIONS)
+    merged.update(options or {})
+    if merged["timing"] not in TIMING_MODES:
+        raise ValueError("unknown timing mode {!r}".format(merged["timing"]))
+    if merged["cache"] not in CACHE_MODES:
+        raise ValueError("unknown cache mode {!r}".format(merged["cache"]))
+    #Only a file can be evicted from the OS cache
+    if merged["cache"] == "cold":
+        merged["snapshot"] = "file"
+    #In-memory snapshots cannot be shared with worker processes, and each
+    #worker builds its own, so there is nothing to gain from them
+    if merged["jobs"] > 1:
+        merged["snapshot"] = "file"
+    if merged["adaptive"] is not None:
+        adaptive = dict(ADAPTIVE_SETTINGS)
+        adaptive.update(merged["adaptive"])
+        if adaptive["min_runs"] < 2 or adaptive["max_runs"] < adaptive["min_runs"]:
+            raise ValueError("adaptive runs need 2 <= min_runs <= max_runs")
+        merged["adaptive"] = adaptive
+    return merged
+
+#Asks the OS to drop its cached pages of a file. Returns False where
+#posix_fadvise is not available (e.g. Windows, macOS), in which case only
+#SQLite's own cache is dropped.
+def evict_os_cache(path):
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        #Dirty pages cannot be evicted, so flush them first
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+#Empties SQLite's page cache for the connection and the file's pages from the
+#OS cache, so the next run reads everything from disk
+def make_cold(cursor, path):
+    cursor.execute("PRAGMA shrink_memory")
+    return evict_os_cache(path)
+
+#Executes the query once and returns (wall ns, cpu ns). With a result cache
+#the rows come from it when it can answer, and are always fetched.
+def time_once(cursor, sql, params, fetch=True, cache=None):
+    cpuStart = time.process_time_ns()
+    start = time.perf_counter_ns()
+    if cache is not None:
+        resultcache.execute(cache, cursor, sql, params)
+    else:
+        cursor.execute(sql, params)
+        if fetch:
+            cursor.fetchall()
+    elapsed = time.perf_counter_ns() - start
+    cpuElapsed = time.process_time_ns() - cpuStart
+
+    #In execute mode the rest of the rows are discarded untimed
+    if not fetch and cache is None:
+        cursor.fetchall()
+    return elapsed, cpuElapsed
+
+#Times timeOne(run) over runs and returns (times, cpu times, convergence),
+#each time divided by perRun. Without adaptive settings every run is timed
+#once and convergence is None. With them, runs are cycled through until the
+#median's CI is narrower than the target, max_runs is reached or the budget
+#is spent, so a microsecond lookup gets thousands of samples and a slow scan
+#stops after a few. The CI is checked after min_runs and then every 10% more
+#runs, since each check sorts everything so far. newCycle, if given, is
+#called untimed before each pass over runs after the first, so state that
+#remembers parameters (a result cache) can be reset rather than turn every
+#later run into a repeat. convergence is
+#   {"target": 0.05, "width": relative CI width at the end,
+#    "converged": True, "stopped": "converged", "budget" or "max_runs",
+#    "seconds": wall time of the timed loop}
+def timed_runs(timeOne, runs, perRun=1, adaptive=None, newCycle=None):
+    times = array("q")
+    cpuTimes = array("q")
+    if adaptive is None or not runs:
+        for run in runs:
+            elapsed, cpuElapsed = timeOne(run)
+            times.append(elapsed // perRun)
+            cpuTimes.append(cpuElapsed // perRun)
+        return times, cpuTimes, None
+
+    start = time.perf_counter()
+    nextCheck = adaptive["min_runs"]
+    stopped = None
+    while stopped is None:
+        if newCycle is not None and times and len(times) % len(runs) == 0:
+            newCycle()
+        elapsed, cpuElapsed = timeOne(runs[len(times) % len(runs)])
+        times.append(elapsed // perRun)
+        cpuTimes.append(cpuElapsed // perRun)
+        if len(times) >= nextCheck:
+            if stats.relative_ci_width(sorted(times)) <= adaptive["target"]:
+                stopped = "converged"
+            nextCheck = len(times) + max(10, len(times) // 10)
+        if stopped is None and len(times) >= adaptive["max_runs"]:
+            stopped = "max_runs"
+        elif stopped is None and time.perf_counter() - start >= adaptive["budget"]:
+            stopped = "budget"
+
+    #A budget spent before min_runs leaves too few runs to judge the CI by
+    width = stats.relative_ci_width(sorted(times))
+    return times, cpuTimes, {
+        "target": adaptive["target"],
+        "width": width,
+        "converged": len(times) >= adaptive["min_runs"] and width <= adaptive["target"],
+        "stopped": stopped,
+        "seconds": time.perf_counter() - start,
+    }
+
+#Returns query as scenarioSpec runs it: with the scenario's SQL if it has its
+#own, otherwise unchanged
+def scenario_query(query, scenarioSpec):
+    if not scenarioSpec.get("sql"):
+        return query
+    return dict(query, sql=scenarioSpec["sql"], batch_sql=scenarioSpec.get("batch_sql"))
+
+#Times one query under one scenario on one database, using the given
+#parameters, and returns the result dict
+def run_cell(query, path, scenarioName, params, options=None):
+    options = make_options(options)
+    if not params:
+        raise ValueError("no parameters to run {} with on {}".format(query["name"], path))
+    scenarioSpec = query["scenarios"][scenarioName]
+    query = scenario_query(query, scenarioSpec)
+    if scenarioSpec.get("engine") == "columnar":
+        import columnar
+        return columnar.run_cell(query, path, scenarioName, params, options)
+    cold = options["cache"] == "cold"
+
+    #The scenario's copy of the database is built once and reused; none of
+    #this is timed
+    uri = snapshots.snapshot(path, scenarioSpec["setup"] + query["setup"], options["snapshot"],
+                             scenarioSpec["unkeyed"])
+
+    #Connect fresh for every scenario so settings from the last one are gone
+    connection = connect(uri, uri=True, cachedStatements=options["cached_statements"])
+    cursor = connection.cursor()
+    osEvicted = False
+    try:
+        set_pragmas(cursor, scenarioSpec["pragmas"])
+
+        #Read-only queries run in autocommit mode with writes refused, so no
+        #transaction is opened and nothing is ever committed in the loop
+        if query["readonly"]:
+            connection.isolation_level = None
+            cursor.execute("PRAGMA query_only=ON")
+
+        #In batch mode one statement answers every parameter; each timed run
+        #is a whole batch, recorded below as time per parameter
+        if options["batch"]:
+            batchSQL, batchArgs = batch_statement(query, params)
+            runs = [(batchSQL, batchArgs)] * options["batch_repeats"]
+        else:
+            runs = [(query["sql"], p) for p in params]
+
+        #The plan is captured with the first parameters; the queries here
+        #only take equality parameters, so it is the same for all of them
+        plan = plans.explain(cursor, runs[0][0], runs[0][1])
+        problems = plans.check_plan(plan, scenarioSpec["expect"])
+
+        #Every batch repeat is the same statement, so a result cache would
+        #only ever measure itself; it is left out in batch mode
+        cacheSettings = scenarioSpec.get("cache")
+        cache = resultcache.make_cache(**cacheSettings) if cacheSettings and not options["batch"] else None
+
+        with TIMING_LOCK or contextlib.nullcontext():
+            #Hot mode: run the query a few times untimed so the caches are warm
+            fetch = options["timing"] == "full"
+            if not cold:
+                for i in range(options["warmup"]):
+                    time_once(cursor, runs[i % len(runs)][0], runs[i % len(runs)][1], fetch, cache)
+
+            #Warm-up warms SQLite's pages, not the result cache; otherwise its
+            #parameters would be counted as hits
+            if cache is not None:
+                cache = resultcache.make_cache(**cacheSettings)
+
+            #Wall time comes from perf_counter, which is monotonic and includes
+            #I/O wait; process_time only counts CPU, so it is kept separately.
+            #Both are integer nanoseconds so nothing accumulates float error.
+            evicted = []
+
+            def timeOne(run):
+                if cold:
+                    evicted.append(make_cold(cursor, snapshots.snapshot_file(uri)))
+                return time_once(cursor, run[0], run[1], fetch, cache)
+
+            #Adaptive runs cycle through the sampled parameters; the result
+            #cache is emptied at every new cycle so its hit rate only counts
+            #repeats the sample itself contains
+            def newCycle():
+                resultcache.clear(cache)
+
+            perRun = len(params) if options["batch"] else 1
+            times, cpuTimes, convergence = timed_runs(timeOne, runs, perRun, options["adaptive"],
+                                                      newCycle if cache is not None else None)
+            osEvicted = bool(evicted) and evicted[-1]
+
+        #Counting slows every step, so it never overlaps the timed runs; an
+        #adaptive cell only counts the parameters it actually timed
+        counters = instrument.instrument_runs(connection, runs[:len(times)]) if options["instrument"] else None
+    finally:
+        connection.close()
+
+    return {
+        "query": query["name"],
+        "db": path,
+        "scenario": scenarioName,
+        "timing": options["timing"],
+        "comparable": options["timing"] == "full",
+        "cache": options["cache"],
+        "warmup": 0 if cold else options["warmup"],
+        "snapshot": options["snapshot"],
+        "build": snapshots.build_reports(uri),
+        "plan": plan,
+        "plan_problems": problems,
+        "os_evicted": osEvicted,
+        "result_cache": resultcache.cache_stats(cache) if cache is not None else None,
+        "columnar": None,
+        "instrumentation": counters,
+        "cached_statements": options["cached_statements"],
+        "batch": len(params) if options["batch"] else 0,
+        "sampling": dict(options["sampling"]),
+        "jobs": options["jobs"],
+        "runs": len(times),
+        "convergence": convergence,
+        "times": times,
+        "cpu_times": cpuTimes,
+        "summary": stats.summarize(times),
+        "cpu_summary": stats.summarize(cpuTimes),
+    }
+
+#Runs every query over every database and scenario and returns the results
+def run(queries, paths=DEFAULT_PATHS, scenarios=DEFAULT_SCENARIOS, runs=DEFAULT_RUNS, options=None):
+    options = make_options(options)
+    undeclared = undeclared_scenarios(queries, scenarios)
+    if undeclared:
+        raise ValueError("unknown scenario: " + "; ".join(undeclared))
+
+    #Refuse to start if any scenario sets a PRAGMA SQLite would ignore
+    names = set()
+    for query in queries:
+        for scenarioName in scenarios:
+            names.update(query["scenarios"][scenarioName]["pragmas"])
+    plans.validate_pragmas(names)
+
+    #Fail now rather than after hours of runs if numpy is missing
+    if any(query["scenarios"][scenarioName].get("engine") == "columnar"
+           for query in queries for scenarioName in scenarios):
+        import columnar
+
+    cells = []
+    for query in queries:
+        for path in paths:
+            #sqlite3.connect would silently create an empty file
+            if not os.path.exists(path):
+                print("Skipping missing database:", path)
+                continue
+            print("Sampling {} parameters from {}".format(query["name"], path))
+
+            #Sample the inputs once per database so every scenario gets the
+            #same parameters; adaptive cells cycle through a larger pool
+            count = max(runs, options["adaptive"]["pool"]) if options["adaptive"] else runs
+            connection = snapshots.connect_readonly(path)
+            params = query["sampler"](connection.cursor(), count, **options["sampling"])
+            connection.close()
+            #An empty table gives nothing to run with
+            if not params:
+                print("Skipping {} on {}: no parameters could be sampled".format(query["name"], path))
+                continue
+
+            for scenarioName in scenarios:
+                cells.append((query, path, scenarioName, params))
+
+    if options["jobs"] > 1:
+        import parallel
+        return parallel.run_cells(cells, options)
+
+    results = []
+    for query, path, scenarioName, params in cells:
+        print("    Running {} on {}: {}".format(query["name"], path, scenarioName))
+        results.append(run_cell(query, path, scenarioName, params, options))
+    return results
+
+#--------------------------------------------------------
+#                      REPORTING
+#--------------------------------------------------------
+
+#Results not timed in full mode are marked with a * and must not be compared
+#against full results
+def print_results(results):
+    columns = ["min", "median", "p95", "p99", "max", "stddev"]
+    print("\nAll times in ms; CI is the bootstrap 95% interval of the median")
+    if any(r["batch"] for r in results):
+        print("Batched cells: each run is a whole batch, shown as time per parameter")
+    print("{:<6} {:<20} {:<16} {:<5} {:>5} ".format("query", "database", "scenario", "cache", "runs")
+          + " ".join("{:>9}".format(c) for c in columns)
+          + " {:>21} {:>9}".format("median CI", "cpu med"))
+    flagged = False
+    for result in results:
+        summary = result["summary"]
+        marker = ("" if result["comparable"] else " *") + (" !" if result["plan_problems"] else "")
+        flagged = flagged or not result["comparable"]
+        print("{:<6} {:<20} {:<16} {:<5} {:>5} ".format(
+                result["query"], result["db"], result["scenario"], result["cache"], result["runs"])
+              + " ".join("{:>9.4f}".format(summary[c] / 1e6) for c in columns)
+              + " {:>21} {:>9.4f}{}".format(
+                "[{:.4f}, {:.4f}]".format(summary["ci_low"] / 1e6, summary["ci_high"] / 1e6),
+                result["cpu_summary"]["median"] / 1e6, marker))
+    if flagged:
+        print("* timed with cursor.execute() only; not comparable with full timings")
+    if any(r["plan_problems"] for r in results):
+        print("! query plan differs from what the scenario expects; see below")
+    if any(r["cache"] == "cold" and not r["os_evicted"] for r in results):
+        print("cold runs could not evict the OS page cache here; only SQLite's cache was dropped")
+
+    #Cells whose plan is not what the scenario expects
+    unexpected = [r for r in results if r["plan_problems"]]
+    if unexpected:
+        print("\nUnexpected query plans (these numbers may not measure the intended scenario):")
+        for result in unexpected:
+            plans.print_plan(result)
+
+    cached = [r for r in results if r.get("result_cache")]
+    if cached:
+        print("\nResult cache (a hit is answered without running the query):")
+        for result in cached:
+            cacheStats = result["result_cache"]
+            print("    {:<6} {:<20} {:<16} hit rate {:>6.1%}  {:>5} entries  {:>9,} bytes  {} invalidations".format(
+                result["query"], result["db"], result["scenario"], cacheStats["hit_rate"],
+                cacheStats["entries"], cacheStats["bytes"], cacheStats["invalidations"]))
+
+    columnarCells = [r for r in results if r.get("columnar")]
+    if columnarCells:
+        print("\nColumnar copies (loaded once per database and process, not included in the times above):")
+        seen = set()
+        for result in columnarCells:
+            if result["db"] in seen:
+                continue
+            seen.add(result["db"])
+            copy = result["columnar"]
+            print("    {:<20} loaded in {:.3f}s, arrays {:,.1f} MiB, resident memory +{:,.1f} MiB".format(
+                result["db"], copy["load_seconds"], copy["bytes"] / 2 ** 20, copy["rss_delta"] / 2 ** 20))
+
+    adaptive = [r for r in results if r.get("convergence")]
+    if adaptive:
+        print("\nAdaptive run count (runs taken until the median CI was narrow enough):")
+        for result in adaptive:
+            convergence = result["convergence"]
+            print("    {:<6} {:<20} {:<16} {:>7,} runs in {:>6.2f}s, CI width {:>6.1%} of the median (target {:.1%}): {}".format(
+                result["query"], result["db"], result["scenario"], result["runs"], convergence["seconds"],
+                convergence["width"], convergence["target"],
+                "converged" if convergence["converged"] else "NOT converged, stopped by " + convergence["stopped"]))
+
+    instrumented = [r for r in results if r.get("instrumentation")]
+    if instrumented:
+        print("\nInstrumentation (an untimed pass over the same parameters):")
+        for result in instrumented:
+            instrument.print_instrumentation(result)
+
+    #Setup cost is reported apart from query cost; a snapshot shared by
+    #several cells is only listed once
+    seen = set()
+    for result in results:
+        for report in result.get("build", []):
+            key = (result["db"], id(report))
+            if key in seen:
+                continue
+            if not seen:
+                print("\nScenario setup (not included in the times above):")
+            seen.add(key)
+            print("    {:<20} {:<16}".format(result["db"], result["scenario"]), end="")
+            variants.print_build(report, indent="")
+
+#Runs one declared query with the defaults, saves its results (see
+#history.py) and its chart; used by the QnA3.py drivers. Run counts are
+#adaptive, so fast and slow cells each get as many runs as they need.
+def run_driver(query, title, chartPath):
+    import history
+    results = run([query], options={"adaptive": {}})
+    print_results(results)
+    history.save(results, label=query["name"])
+
+    import plots
+    plots.grouped_bar(results, title, chartPath)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the assignment query benchmarks")
+    parser.add_argument("--query", action="append", help="query name, e.g. Q1 (default: all)")
+    parser.add_argument("--db", action="append", help="database path (default: Small, Medium, Large)")
+    parser.add_argument("--scenario", action="append", help="scenario name (default: the standard ones)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help="runs per cell, or with --adaptive the fewest parameters to sample")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="time each cell until its median CI is narrow enough or the budget runs out")
+    parser.add_argument("--target-ci", type=float, default=ADAPTIVE_SETTINGS["target"],
+                        help="with --adaptive, CI width relative to the median to stop at (default: 0.05)")
+    parser.add_argument("--budget", type=float, default=ADAPTIVE_SETTINGS["budget"],
+                        help="with --adaptive, seconds of timed runs per cell (default: 10)")
+    parser.add_argument("--max-runs", type=int, default=ADAPTIVE_SETTINGS["max_runs"],
+                        help="with --adaptive, most runs per cell")
+    parser.add_argument("--timing", choices=TIMING_MODES, default=DEFAULT_OPTIONS["timing"],
+                        help="full: execute + fetch (default); execute: legacy execute-only")
+    parser.add_argument("--cache", choices=CACHE_MODES, default=DEFAULT_OPTIONS["cache"],
+                        help="hot: warm up first (default); cold: fresh copy, caches dropped before each run")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_OPTIONS["warmup"],
+                        help="discarded executions before timing in hot mode")
+    parser.add_argument("--snapshot", choices=snapshots.SNAPSHOT_KINDS, default=DEFAULT_OPTIONS["snapshot"],
+                        help="keep scenario snapshots in temp files (default) or in memory")
+    parser.add_argument("--cached-statements", type=int, default=DEFAULT_OPTIONS["cached_statements"],
+                        help="prepared statement cache size per connection; 0 re-prepares every run")
+    parser.add_argument("--batch", action="store_true",
+                        help="answer all sampled parameters in one statement per run")
+    parser.add_argument("--batch-repeats", type=int, default=DEFAULT_OPTIONS["batch_repeats"])
+    parser.add_argument("--distribution", choices=samplers.DISTRIBUTIONS,
+                        help="how parameters are drawn (default: as each query declares)")
+    parser.add_argument("--seed", type=int, help="seed for parameter sampling")
+    parser.add_argument("--zipf-s", type=float, help="exponent of the zipf distribution")
+    parser.add_argument("--replay", help="log of parameter values for the replay distribution")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_OPTIONS["jobs"],
+                        help="run this many (database, scenario) cells at once in a process pool")
+    parser.add_argument("--pin", action="store_true", help="pin each worker process to one CPU")
+    parser.add_argument("--serialize-timing", action="store_true",
+                        help="with --jobs, build snapshots concurrently but time one cell at a time")
+    parser.add_argument("--show-plans", action="store_true", help="print the query plan of every cell")
+    parser.add_argument("--instrument", action="store_true",
+                        help="also count VM steps and trace statements in an untimed pass")
+    parser.add_argument("--save", metavar="FILE", default="./results.jsonl",
+                        help="append the results to this JSONL file (default: ./results.jsonl)")
+    parser.add_argument("--no-save", action="store_true", help="do not save the results")
+    parser.add_argument("--label", help="name for this run in the results file, e.g. before-index")
+    args = parser.parse_args(argv)
+
+    queries = load_queries()
+    names = args.query or list(queries)
+    for name in names:
+        if name not in queries:
+            parser.error("unknown query {} (known: {})".format(name, ", ".join(queries)))
+    undeclared = undeclared_scenarios([queries[name] for name in names], args.scenario or DEFAULT_SCENARIOS)
+    if undeclared:
+        parser.error("unknown scenario: {}; pick the queries with --query".format("; ".join(undeclared)))
+
+    sampling = {}
+    for key, value in [("distribution", args.distribution), ("seed", args.seed),
+                       ("s", args.zipf_s), ("log", args.replay)]:
+        if value is not None:
+            sampling[key] = value
+
+    results = run(
+        [queries[name] for name in names],
+        args.db or DEFAULT_PATHS,
+        args.scenario or DEFAULT_SCENARIOS,
+        args.runs,
+        {"timing": args.timing, "cache": args.cache, "warmup": args.warmup,
+         "snapshot": args.snapshot, "cached_statements": args.cached_statements,
+         "batch": args.batch, "batch_repeats": args.batch_repeats, "jobs": args.jobs, "pin": args.pin,
+         "serialize_timing": args.serialize_timing, "sampling": sampling, "instrument": args.instrument,
+         "adaptive": {"target": args.target_ci, "budget": args.budget, "max_runs": args.max_runs}
+                     if args.adaptive else None},
+    )
+    print_results(results)
+    if args.show_plans:
+        print("\nQuery plans:")
+        for result in results:
+            plans.print_plan(result)
+    if not args.no_save:
+        import history
+        history.save(results, args.save, args.label)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+import contextlib
+import os
+import resource
+import time
+
+import numpy as np
+
+import benchmark
+import snapshots
+import stats
+
+#--------------------------------------------------------
+#                  COLUMNAR ENGINE (NUMPY)
+#--------------------------------------------------------
+#The four queries answered from an in-memory columnar copy of the tables
+#instead of by SQLite, to see whether SQLite belongs on this path at all.
+#Runs as the Columnar scenario (see benchmark.standard_scenarios); needs numpy.
+#
+#Every column is a NumPy array. The text keys are dictionary encoded: all
+#values of one key (customer_id, order_id, seller_id) across every table that
+#holds it are sorted into one dictionary and each row stores its position, so
+#joins compare small integers. Because codes are dense (0..n-1), the build side
+#of a join on a key is just an array indexed by code - a perfect hash - and
+#grouped aggregation is np.bincount over codes.
+#
+#A copy is built once per database and process and kept, like a snapshot;
+#its load time and size are reported with the results.
+#
+#A copy is a plain dict:
+#   {"keys": {"customer_id": sorted array of strings, ...},
+#    "Customers": {"customer_id": codes, "customer_postal_code": values}, ...,
+#    "load_seconds": 1.2, "bytes": bytes of every array, "rss_delta": bytes}
+
+#Tables and columns copied, and which key dictionary each text column uses
+COLUMNS = {
+    "Customers": ["customer_id", "customer_postal_code"],
+    "Orders": ["order_id", "customer_id"],
+    "Order_items": ["order_id", "order_item_id", "seller_id"],
+    "Sellers": ["seller_id", "seller_postal_code"],
+}
+KEYS = ["customer_id", "order_id", "seller_id"]
+
+_copies = {}
+
+#Resident set size of this process in bytes: current where /proc exists,
+#otherwise the peak so far
+def rss():
+    try:
+        with open("/proc/self/statm") as fl:
+            return int(fl.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        #ru_maxrss is in KiB on Linux and in bytes on macOS
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+#Reads the tables of the database at path into a columnar copy
+def load(path):
+    rssBefore = rss()
+    start = time.perf_counter()
+    connection = snapshots.connect_readonly(path)
+    raw = {}
+    try:
+        for table, columns in COLUMNS.items():
+            rows = connection.execute('SELECT {} FROM "{}"'.format(", ".join(columns), table)).fetchall()
+            raw[table] = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+    finally:
+        connection.close()
+
+    copy = {"keys": {}}
+    for key in KEYS:
+        values = [raw[table][key] for table in COLUMNS if key in COLUMNS[table]]
+        copy["keys"][key] = np.unique(np.concatenate([np.array(v, dtype=object) for v in values]).astype(str))
+    for table, columns in COLUMNS.items():
+        copy[table] = {}
+        for column in columns:
+            if column in KEYS:
+                codes = np.searchsorted(copy["keys"][column], np.array(raw[table][column], dtype=str))
+                copy[table][column] = codes.astype(np.int32)
+            else:
+                copy[table][column] = np.array(raw[table][column], dtype=np.int64)
+    del raw
+
+    #Build sides of the joins: postal code by customer and by seller code
+    customers = copy["keys"]["customer_id"].size
+    copy["customer_postal"] = np.full(customers, -1, dtype=np.int64)
+    copy["customer_postal"][copy["Customers"]["customer_id"]] = copy["Customers"]["customer_postal_code"]
+    copy["seller_postal"] = np.full(copy["keys"]["seller_id"].size, -1, dtype=np.int64)
+    copy["seller_postal"][copy["Sellers"]["seller_id"]] = copy["Sellers"]["seller_postal_code"]
+
+    copy["load_seconds"] = time.perf_counter() - start
+    copy["bytes"] = sum(a.nbytes for a in copy["keys"].values()) \
+        + sum(a.nbytes for table in COLUMNS for a in copy[table].values()) \
+        + copy["customer_postal"].nbytes + copy["seller_postal"].nbytes
+    copy["rss_delta"] = rss() - rssBefore
+    return copy
+
+#Returns the columnar copy of a database, loading it on first use
+def columnar_copy(path):
+    key = os.path.abspath(path)
+    if key not in _copies:
+        _copies[key] = load(path)
+    return _copies[key]
+
+#Code of a key value, or -1 if no row has it
+def encode(copy, key, value):
+    dictionary = copy["keys"][key]
+    i = int(np.searchsorted(dictionary, value))
+    return i if i < dictionary.size and dictionary[i] == value else -1
+
+#--------------------------------------------------------
+#                      QUERIES
+#--------------------------------------------------------
+#Each takes a copy and one parameter dict and returns the rows SQLite would
+
+#Orders whose customer is in postal code code
+def orders_in(copy, code):
+    return copy["customer_postal"][copy["Orders"]["customer_id"]] == code
+
+def q1(copy, params):
+    return [(int(np.count_nonzero(orders_in(copy, params["code"]))),)]
+
+#Q2 and Q3: count and average size of the orders in a postal code, where size
+#is the number of distinct item ids; orders without items have no size and,
+#as with the inner join on OrderSize, are not counted
+def q2(copy, params):
+    orders = copy["Orders"]["order_id"][orders_in(copy, params["code"])]
+    wanted = np.zeros(copy["keys"]["order_id"].size, dtype=bool)
+    wanted[orders] = True
+    items = copy["Order_items"]
+    selected = wanted[items["order_id"]]
+
+    #Distinct (order, item id) pairs, then a count per order
+    pairs = np.unique(np.stack([items["order_id"][selected], items["order_item_id"][selected]]), axis=1)
+    sizes = np.bincount(pairs[0], minlength=wanted.size)[orders]
+    sizes = sizes[sizes > 0]
+    if sizes.size == 0:
+        return [(0, None)]
+    return [(int(sizes.size), float(sizes.mean()))]
+
+#Distinct seller postal codes among the items of one order; items whose
+#seller is not in Sellers have no postal code (-1 in seller_postal) and, as
+#with the inner join, are not counted
+def q4(copy, params):
+    code = encode(copy, "order_id", params["orderID"])
+    sellers = copy["Order_items"]["seller_id"][copy["Order_items"]["order_id"] == code]
+    postals = copy["seller_postal"][sellers]
+    return [(int(np.unique(postals[postals != -1]).size),)]
+
+QUERIES = {"Q1": q1, "Q2": q2, "Q3": q2, "Q4": q4}
+
+#--------------------------------------------------------
+#                      BENCHMARK CELL
+#--------------------------------------------------------
+
+#Returns a description of every parameter dict whose columnar answer differs
+#from SQLite's, so a wrong answer is flagged like an unexpected plan
+def check_answers(query, path, copy, params):
+    problems = []
+    uri = snapshots.snapshot(path, query["setup"], "file")
+    connection = benchmark.connect(uri, uri=True)
+    try:
+        for p in params:
+            expected = [tuple(row) for row in connection.execute(query["sql"], p).fetchall()]
+            actual = QUERIES[query["name"]](copy, p)
+            if [tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in expected] != \
+                    [tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in actual]:
+                problems.append("columnar answer {} differs from SQLite {} for {}".format(actual, expected, p))
+    finally:
+        connection.close()
+    return problems
+
+#Times query on the columnar copy of the database at path; returns the same
+#result dict as benchmark.run_cell, with "columnar" holding the copy's load
+#time and memory. Batch and cold modes do not apply to an in-memory copy, so
+#every parameter is run on its own with warm-up.
+def run_cell(query, path, scenarioName, params, options=None):
+    options = benchmark.make_options(options)
+    if not params:
+        raise ValueError("no parameters to run {} with on {}".format(query["name"], path))
+    if query["name"] not in QUERIES:
+        raise ValueError("query {} has no columnar implementation".format(query["name"]))
+    function = QUERIES[query["name"]]
+    copy = columnar_copy(path)
+    problems = check_answers(query, path, copy, params[:5])
+
+    with benchmark.TIMING_LOCK or contextlib.nullcontext():
+        for i in range(options["warmup"]):
+            function(copy, params[i % len(params)])
+
+        def timeOne(p):
+            cpuStart = time.process_time_ns()
+            start = time.perf_counter_ns()
+            function(copy, p)
+            return time.perf_counter_ns() - start, time.process_time_ns() - cpuStart
+
+        times, cpuTimes, convergence = benchmark.timed_runs(timeOne, params, adaptive=options["adaptive"])
+
+    return {
+        "query": query["name"],
+        "db": path,
+        "scenario": scenarioName,
+        "timing": "full",
+        "comparable": True,
+        "cache": "hot",
+        "warmup": options["warmup"],
+        "snapshot": "columnar",
+        "build": [],
+        "plan": ["columnar copy in NumPy arrays"],
+        "plan_problems": problems,
+        "os_evicted": False,
+        "result_cache": None,
+        "instrumentation": None,
+        "columnar": {"load_seconds": copy["load_seconds"], "bytes": copy["bytes"], "rss_delta": copy["rss_delta"]},
+        "cached_statements": 0,
+        "batch": 0,
+        "sampling": dict(options["sampling"]),
+        "jobs": options["jobs"],
+        "runs": len(times),
+        "convergence": convergence,
+        "times": times,
+        "cpu_times": cpuTimes,
+        "summary": stats.summarize(times),
+        "cpu_summary": stats.summarize(cpuTimes),
+    }
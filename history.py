@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import uuid
+
+import samplers
+import stats
+
+#--------------------------------------------------------
+#                      RESULT HISTORY
+#--------------------------------------------------------
+#Benchmark results saved as JSON lines, one record per cell, so runs can be
+#kept and compared later instead of living only in printed output. A record
+#is the result dict (see benchmark.py) with its latencies as lists, plus what
+#is needed to know what was measured:
+#   {"run_id": "20240101T120000-1a2b3c", "recorded": ISO time, "label": ...,
+#    "git_commit": ..., "git_dirty": False, "sqlite_version": "3.40.1",
+#    "python": "3.11.2", "platform": ..., "db_fingerprint": sha1 of the file,
+#    "query": "Q1", "db": ..., "scenario": ..., "plan": [...],
+#    "times": [ns, ...], "summary": {...}, ...}
+#
+#The compare command matches the cells of two runs by (query, database file
+#name, scenario) and tests each pair with a Mann-Whitney U test. A cell has
+#regressed when its median got slower by more than the threshold and the
+#difference is significant; any regression makes the command exit with 1, so
+#it can gate index or schema changes. When both runs were instrumented (see
+#instrument.py), a rise in median VM steps above the threshold is a
+#regression too: step counts do not depend on how busy the machine was.
+
+DEFAULT_PATH = "./results.jsonl"
+
+#Median slowdown (0.10 = 10%) above which a significant change is a regression
+REGRESSION_THRESHOLD = 0.10
+
+#p-value below which a difference is significant
+SIGNIFICANCE = 0.05
+
+_fingerprints = {}
+
+#Commit the code was run at, and whether tracked files had changes; None
+#outside a git checkout
+def git_state():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=directory, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+#sha1 of a database file's contents, so runs on different copies of the
+#same data compare and runs on different data are caught. Memoized by path,
+#size and modification time.
+def database_fingerprint(path):
+    key = samplers.fingerprint(path)
+    if key not in _fingerprints:
+        digest = hashlib.sha1()
+        with open(path, "rb") as fl:
+            for block in iter(lambda: fl.read(1 << 20), b""):
+                digest.update(block)
+        _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+def environment():
+    commit, dirty = git_state()
+    return {
+        "git_commit": commit,
+        "git_dirty": dirty,
+        "sqlite_version": sqlite3.sqlite_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+def new_run_id():
+    return "{}-{}".format(datetime.datetime.now().strftime("%Y%m%dT%H%M%S"), uuid.uuid4().hex[:6])
+
+#JSON-ready copy of a result with the run's details added
+def make_record(result, runID, label, env):
+    record = {"run_id": runID, "recorded": datetime.datetime.now().isoformat(timespec="seconds"), "label": label}
+    record.update(env)
+    record["db_fingerprint"] = database_fingerprint(result["db"]) if os.path.exists(result["db"]) else None
+    for key, value in result.items():
+        record[key] = list(value) if key in ("times", "cpu_times") else value
+    return record
+
+#Appends one record per result to the file at path and returns the run id
+def save(results, path=DEFAULT_PATH, label=None):
+    runID = new_run_id()
+    env = environment()
+    with open(path, "a") as fl:
+        for result in results:
+            fl.write(json.dumps(make_record(result, runID, label, env), default=str) + "\n")
+    print("Saved {} results as run {} in {}".format(len(results), runID, path))
+    return runID
+
+def load(path=DEFAULT_PATH):
+    with open(path) as fl:
+        return [json.loads(line) for line in fl if line.strip()]
+
+#Run ids in the order they were saved
+def run_ids(records):
+    ids = []
+    for record in records:
+        if record["run_id"] not in ids:
+            ids.append(record["run_id"])
+    return ids
+
+#Records of one run. spec is a run id, a label (its latest run), "latest",
+#or a negative position such as -2 for the run before the latest.
+def select(records, spec):
+    ids = run_ids(records)
+    if not ids:
+        raise ValueError("no runs saved")
+    if spec == "latest":
+        spec = "-1"
+    if spec.lstrip("-").isdigit() and spec.startswith("-"):
+        if int(spec) < -len(ids):
+            raise ValueError("only {} runs saved".format(len(ids)))
+        runID = ids[int(spec)]
+    elif spec in ids:
+        runID = spec
+    else:
+        labelled = [record["run_id"] for record in records if record.get("label") == spec]
+        if not labelled:
+            raise ValueError("no run with id or label {!r}".format(spec))
+        runID = labelled[-1]
+    return [record for record in records if record["run_id"] == runID]
+
+#Median VM steps of an instrumented record, otherwise None
+def vm_steps(record):
+    counters = record.get("instrumentation")
+    if not counters or not counters["vm_steps"]:
+        return None
+    return stats.median(counters["vm_steps"])
+
+#How a record's latencies were taken, e.g. "full/hot, batch of 50,
+#adaptive to 5%"; only records measured the same way compare
+def measurement(record):
+    parts = ["{}/{}".format(record["timing"], record["cache"])]
+    if record.get("batch"):
+        parts.append("batch of {}".format(record["batch"]))
+    if record.get("convergence"):
+        parts.append("adaptive to {:.0%}".format(record["convergence"]["target"]))
+    return ", ".join(parts)
+
+def cell_key(record):
+    return record["query"], os.path.basename(record["db"]), record["scenario"]
+
+#Compares every cell present in both runs and returns one row per cell:
+#   {"key", "base", "new", "change" (median ratio - 1), "p", "status", "notes"}
+#status is "regression", "improvement", "unchanged" or "incomparable"
+def compare(base, new, threshold=REGRESSION_THRESHOLD, alpha=SIGNIFICANCE):
+    baseCells = {cell_key(record): record for record in base}
+    rows = []
+    for record in new:
+        key = cell_key(record)
+        if key not in baseCells:
+            continue
+        old = baseCells[key]
+        notes = []
+        if old["db_fingerprint"] != record["db_fingerprint"]:
+            notes.append("different database contents")
+        if old["sqlite_version"] != record["sqlite_version"]:
+            notes.append("SQLite {} -> {}".format(old["sqlite_version"], record["sqlite_version"]))
+        if old["plan"] != record["plan"]:
+            notes.append("query plan changed")
+
+        oldMedian = old["summary"]["median"]
+        newMedian = record["summary"]["median"]
+        change = newMedian / oldMedian - 1 if oldMedian else 0.0
+        _, p = stats.mann_whitney(old["times"], record["times"])
+        if measurement(old) != measurement(record):
+            status = "incomparable"
+            notes.append("measured {} vs {}".format(measurement(old), measurement(record)))
+        elif p < alpha and change > threshold:
+            status = "regression"
+        elif p < alpha and change < -threshold:
+            status = "improvement"
+        else:
+            status = "unchanged"
+
+        steps = vm_steps(old), vm_steps(record)
+        if status != "incomparable" and None not in steps and steps[0] > 0:
+            stepsChange = steps[1] / steps[0] - 1
+            if abs(stepsChange) > 0.001:
+                notes.append("VM steps {:+.1%}".format(stepsChange))
+            if stepsChange > threshold:
+                status = "regression"
+        rows.append({"key": key, "base": oldMedian, "new": newMedian, "change": change, "p": p,
+                     "status": status, "notes": notes})
+    return rows
+
+def print_comparison(rows, baseID, newID, threshold, alpha):
+    print("Comparing run {} (base) with {}: medians in ms, Mann-Whitney p, regression above +{:.0%} at p < {}".format(
+        baseID, newID, threshold, alpha))
+    print("{:<6} {:<16} {:<16} {:>10} {:>10} {:>8} {:>8}  {}".format(
+        "query", "database", "scenario", "base", "new", "change", "p", "status"))
+    for row in rows:
+        query, db, scenarioName = row["key"]
+        print("{:<6} {:<16} {:<16} {:>10.4f} {:>10.4f} {:>+7.1%} {:>8.4f}  {}{}".format(
+            query, db, scenarioName, row["base"] / 1e6, row["new"] / 1e6, row["change"], row["p"], row["status"],
+            " ({})".format("; ".join(row["notes"])) if row["notes"] else ""))
+    if not rows:
+        print("No cells in common")
+
+def list_runs(records):
+    print("{:<24} {:<20} {:<12} {:>6}  {}".format("run", "recorded", "commit", "cells", "label"))
+    for runID in run_ids(records):
+        cells = [record for record in records if record["run_id"] == runID]
+        first = cells[0]
+        commit = (first["git_commit"] or "-")[:10] + ("+" if first["git_dirty"] else "")
+        print("{:<24} {:<20} {:<12} {:>6}  {}".format(runID, first["recorded"], commit, len(cells), first["label"] or ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List and compare saved benchmark runs")
+    parser.add_argument("--file", default=DEFAULT_PATH, help="results file written by benchmark.py --save")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the saved runs")
+    comparing = commands.add_parser("compare", help="compare two runs; exits with 1 on a regression")
+    comparing.add_argument("base", nargs="?", default="-2", help="run id, label or -N (default: -2)")
+    comparing.add_argument("new", nargs="?", default="latest", help="run id, label or -N (default: latest)")
+    comparing.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                           help="median slowdown counted as a regression, e.g. 0.1 for 10%%")
+    comparing.add_argument("--alpha", type=float, default=SIGNIFICANCE, help="significance level")
+    args = parser.parse_args(argv)
+
+    records = load(args.file)
+    if args.command == "list":
+        list_runs(records)
+        return 0
+
+    try:
+        base = select(records, args.base)
+        new = select(records, args.new)
+    except ValueError as error:
+        parser.error(str(error))
+    rows = compare(base, new, args.threshold, args.alpha)
+    print_comparison(rows, base[0]["run_id"], new[0]["run_id"], args.threshold, args.alpha)
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if regressions:
+        print("{} regression(s)".format(len(regressions)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
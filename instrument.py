@@ -0,0 +1,108 @@
+import collections
+import sqlite3
+
+#--------------------------------------------------------
+#                      INSTRUMENTATION
+#--------------------------------------------------------
+#Counters that explain a cell's latency: how many virtual machine steps each
+#run took (progress handler calls with N=1; SQLite checks it on loop and
+#branch opcodes, so this follows rows visited rather than every opcode),
+#which statements ran (including ones fired by triggers), what the compiled
+#program does (scans, seeks, temp b-trees, sorters) and how many pages each
+#table and index holds. VM steps do not depend on the machine or
+#its load, so they show a regression even where timings are too noisy to.
+#
+#Counting calls a Python function on every VM step, which slows a query many
+#times over, so the counters come from a separate untimed pass over the same
+#parameters after the timed runs (see benchmark.run_cell); the latencies are
+#never measured with it attached.
+#
+#SQLite's page cache hit and miss counters (sqlite3_db_status) are not
+#exposed by Python's sqlite3 module, so they cannot be recorded here; page
+#counts come from PRAGMA page_count and dbstat, and PRAGMA stats is kept
+#where the SQLite build returns anything for it.
+#
+#Instrumentation is a plain dict stored in the result as "instrumentation":
+#   {"vm_steps": [steps per run], "statements": [statements per run],
+#    "traced": [distinct statement text], "opcodes": {opcode: count},
+#    "pages_before": [page_count per run], "pages_after": [...],
+#    "objects": {table or index: pages} or None, "stats": [...] or None}
+
+#Opcodes worth counting in a query's program, and what they mean
+NOTABLE_OPCODES = {
+    "Rewind": "loop starting a full scan",
+    "SeekGE": "index range search", "SeekGT": "index range search",
+    "SeekLE": "index range search", "SeekLT": "index range search",
+    "SeekRowid": "rowid lookup", "NotExists": "rowid lookup",
+    "OpenEphemeral": "temp b-tree (subquery, DISTINCT, IN list)",
+    "OpenAutoindex": "automatic index built per execution",
+    "SorterOpen": "sort (ORDER BY, GROUP BY)",
+    "AggStep": "aggregate step",
+}
+
+#Counts of the notable opcodes in the compiled program of sql
+def program_opcodes(connection, sql, params):
+    counts = collections.Counter(row[1] for row in connection.execute("EXPLAIN " + sql, params))
+    return {opcode: counts[opcode] for opcode in NOTABLE_OPCODES if counts[opcode]}
+
+#Pages held by every table and index, or None without dbstat
+def object_pages(connection):
+    try:
+        return dict(connection.execute("SELECT name, COUNT(*) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        return None
+
+#Rows of PRAGMA stats, or None where this build returns nothing for it
+def pragma_stats(connection):
+    try:
+        rows = connection.execute("PRAGMA stats").fetchall()
+    except sqlite3.DatabaseError:
+        return None
+    return [list(row) for row in rows] or None
+
+#Runs every (sql, params) of runs once on connection with the counters
+#attached and returns the instrumentation dict
+def instrument_runs(connection, runs):
+    steps = [0]
+    statements = [0]
+    traced = []
+
+    def progress():
+        steps[0] += 1
+        return 0
+
+    def trace(statement):
+        statements[0] += 1
+        if statement not in traced:
+            traced.append(statement)
+
+    result = {"vm_steps": [], "statements": [], "traced": traced,
+              "opcodes": program_opcodes(connection, runs[0][0], runs[0][1]) if runs else {},
+              "pages_before": [], "pages_after": [],
+              "objects": object_pages(connection), "stats": pragma_stats(connection)}
+    cursor = connection.cursor()
+    for sql, params in runs:
+        result["pages_before"].append(connection.execute("PRAGMA page_count").fetchone()[0])
+        steps[0] = 0
+        statements[0] = 0
+        connection.set_progress_handler(progress, 1)
+        connection.set_trace_callback(trace)
+        try:
+            cursor.execute(sql, params).fetchall()
+        finally:
+            connection.set_progress_handler(None, 1)
+            connection.set_trace_callback(None)
+        result["vm_steps"].append(steps[0])
+        result["statements"].append(statements[0])
+        result["pages_after"].append(connection.execute("PRAGMA page_count").fetchone()[0])
+    return result
+
+def print_instrumentation(result):
+    counters = result["instrumentation"]
+    steps = sorted(counters["vm_steps"])
+    print("    {:<6} {:<20} {:<16} VM steps median {:,}, max {:,}; {:.1f} statements per run".format(
+        result["query"], result["db"], result["scenario"], steps[len(steps) // 2] if steps else 0,
+        steps[-1] if steps else 0, sum(counters["statements"]) / max(len(counters["statements"]), 1)))
+    if counters["opcodes"]:
+        print("        program: " + ", ".join("{} {}".format(count, opcode)
+                                             for opcode, count in sorted(counters["opcodes"].items())))
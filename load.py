@@ -0,0 +1,219 @@
+import argparse
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+import benchmark
+import plans
+import resultcache
+import samplers
+import snapshots
+import stats
+
+#--------------------------------------------------------
+#                  CONCURRENT READER LOAD
+#--------------------------------------------------------
+#Throughput of a query when K readers run it at once against one WAL-mode
+#file, each with its own read-only connection, for a fixed duration. K grows
+#1, 2, 4, ... up to the number of CPUs, which shows where a scenario's indexes
+#stop scaling and where SQLite's locking starts to cost.
+#
+#A result is a plain dict:
+#   {"query": "Q1", "db": ..., "scenario": ..., "mode": "thread",
+#    "workers": 4, "duration": seconds, "queries": n, "qps": n / duration,
+#    "latencies": array('q', [ns, ...]), "summary": stats.summarize(...),
+#    "histogram": {upper bound in us: count}}
+
+WORKER_MODES = ["thread", "process"]
+DEFAULT_DURATION = 5.0
+
+#1, 2, 4, ... up to the number of CPUs, always including the CPU count
+def default_levels():
+    cpus = os.cpu_count() or 1
+    levels = []
+    k = 1
+    while k < cpus:
+        levels.append(k)
+        k *= 2
+    levels.append(cpus)
+    return levels
+
+#Counts latencies into power-of-two microsecond buckets
+def histogram(latencies):
+    buckets = {}
+    for ns in latencies:
+        upper = 2 ** max(0, math.ceil(math.log2(max(ns, 1) / 1000)))
+        buckets[upper] = buckets.get(upper, 0) + 1
+    return dict(sorted(buckets.items()))
+
+#Runs the query over and over for duration seconds and returns its latencies.
+#offset staggers where each reader starts in the parameter list. With
+#cacheSettings each reader has its own result cache (see resultcache.py).
+def reader(uri, pragmas, sql, params, duration, offset=0, cacheSettings=None):
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    cursor = connection.cursor()
+    benchmark.set_pragmas(cursor, pragmas)
+    cache = resultcache.make_cache(**cacheSettings) if cacheSettings else None
+    latencies = array("q")
+    i = offset
+    try:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter_ns()
+            if cache is not None:
+                resultcache.execute(cache, cursor, sql, params[i % len(params)])
+            else:
+                cursor.execute(sql, params[i % len(params)])
+                cursor.fetchall()
+            latencies.append(time.perf_counter_ns() - start)
+            i += 1
+    finally:
+        connection.close()
+    return latencies
+
+def process_reader(args):
+    return reader(*args)
+
+#Runs workers readers at once, as threads or processes, and returns the
+#latencies of each
+def run_level(uri, pragmas, sql, params, workers, duration, mode, cacheSettings=None):
+    jobs = [(uri, pragmas, sql, params, duration, w * 7919, cacheSettings) for w in range(workers)]
+    if mode == "process":
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with context.Pool(workers) as pool:
+            return pool.map(process_reader, jobs)
+
+    #sqlite3 releases the GIL while a statement steps, so threads do overlap
+    parts = [None] * workers
+    def target(w):
+        parts[w] = reader(*jobs[w])
+    threads = [threading.Thread(target=target, args=(w,)) for w in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return parts
+
+#Measures throughput of one query under one scenario at each level of
+#concurrency and returns a result per level
+def run_load(query, path, scenarioName, levels=None, duration=DEFAULT_DURATION, mode="thread", samples=1000,
+             sampling=None):
+    if mode not in WORKER_MODES:
+        raise ValueError("unknown worker mode {!r}".format(mode))
+    scenarioSpec = query["scenarios"][scenarioName]
+    #Readers here are SQLite connections; a scenario answered by another
+    #engine would silently be measured as plain SQLite
+    if scenarioSpec.get("engine"):
+        raise ValueError("{} runs on the {} engine, which load.py cannot measure".format(
+            scenarioName, scenarioSpec["engine"]))
+    plans.validate_pragmas(scenarioSpec["pragmas"])
+
+    connection = snapshots.connect_readonly(path)
+    params = query["sampler"](connection.cursor(), samples, **(sampling or {}))
+    connection.close()
+
+    #A WAL-mode copy of the scenario; the open writer connection keeps the
+    #-wal and -shm files around so read-only connections can use them. The
+    #mode is switched after the build has committed: inside the transaction
+    #an INSERT in the setup opens, SQLite ignores the pragma without an error.
+    uri = snapshots.snapshot(path, scenarioSpec["setup"] + query["setup"], "file", scenarioSpec["unkeyed"])
+    keeper = sqlite3.connect(uri, uri=True, isolation_level=None)
+    journalMode = keeper.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    if journalMode != "wal":
+        keeper.close()
+        raise RuntimeError("{} snapshot stayed in {} journal mode instead of WAL".format(scenarioName, journalMode))
+    readUri = uri + "?mode=ro"
+    sql = benchmark.scenario_query(query, scenarioSpec)["sql"]
+
+    results = []
+    try:
+        for workers in levels or default_levels():
+            print("    {} {}s with {} {} reader(s)".format(scenarioName, duration, workers, mode))
+            parts = run_level(readUri, scenarioSpec["pragmas"], sql, params, workers, duration, mode,
+                              scenarioSpec.get("cache"))
+            latencies = array("q")
+            for part in parts:
+                latencies.extend(part)
+            results.append({
+                "query": query["name"],
+                "db": path,
+                "scenario": scenarioName,
+                "mode": mode,
+                "workers": workers,
+                "duration": duration,
+                "queries": len(latencies),
+                "qps": len(latencies) / duration,
+                "latencies": latencies,
+                "summary": stats.summarize(latencies),
+                "histogram": histogram(latencies),
+            })
+    finally:
+        keeper.close()
+    return results
+
+def print_load(results):
+    print("\n{:<6} {:<20} {:<16} {:<8} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+        "query", "database", "scenario", "mode", "readers", "qps", "p50 (ms)", "p95 (ms)", "p99 (ms)"))
+    for result in results:
+        summary = result["summary"]
+        print("{:<6} {:<20} {:<16} {:<8} {:>7} {:>10.1f} {:>10.4f} {:>10.4f} {:>10.4f}".format(
+            result["query"], result["db"], result["scenario"], result["mode"], result["workers"],
+            result["qps"], summary["median"] / 1e6, summary["p95"] / 1e6, summary["p99"] / 1e6))
+        print("        histogram (us): " + "  ".join(
+            "<={}: {}".format(upper, count) for upper, count in result["histogram"].items()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent reader throughput of the assignment queries")
+    parser.add_argument("--query", action="append", help="query name, e.g. Q1 (default: all)")
+    parser.add_argument("--db", action="append", help="database path (default: Small, Medium, Large)")
+    parser.add_argument("--scenario", action="append", help="scenario name (default: the standard ones)")
+    parser.add_argument("--readers", help="comma separated reader counts (default: 1, 2, 4, ... CPUs)")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per reader count")
+    parser.add_argument("--mode", choices=WORKER_MODES, default="thread",
+                        help="readers are threads (default) or processes")
+    parser.add_argument("--distribution", choices=samplers.DISTRIBUTIONS,
+                        help="how parameters are drawn (default: as each query declares)")
+    parser.add_argument("--seed", type=int, help="seed for parameter sampling")
+    args = parser.parse_args(argv)
+
+    queries = benchmark.load_queries()
+    names = args.query or list(queries)
+    for name in names:
+        if name not in queries:
+            parser.error("unknown query {} (known: {})".format(name, ", ".join(queries)))
+    undeclared = benchmark.undeclared_scenarios([queries[name] for name in names],
+                                                args.scenario or benchmark.DEFAULT_SCENARIOS)
+    if undeclared:
+        parser.error("unknown scenario: {}; pick the queries with --query".format("; ".join(undeclared)))
+    for scenarioName in args.scenario or benchmark.DEFAULT_SCENARIOS:
+        if any(queries[name]["scenarios"][scenarioName].get("engine") for name in names):
+            parser.error("{} does not run on SQLite, so its concurrent readers cannot be measured here".format(
+                scenarioName))
+    levels = [int(k) for k in args.readers.split(",")] if args.readers else None
+    sampling = {}
+    if args.distribution:
+        sampling["distribution"] = args.distribution
+    if args.seed is not None:
+        sampling["seed"] = args.seed
+
+    results = []
+    for name in names:
+        for path in args.db or benchmark.DEFAULT_PATHS:
+            if not os.path.exists(path):
+                print("Skipping missing database:", path)
+                continue
+            print("\n{} using database: {}".format(name, path))
+            for scenarioName in args.scenario or benchmark.DEFAULT_SCENARIOS:
+                results += run_load(queries[name], path, scenarioName, levels, args.duration, args.mode,
+                                    sampling=sampling)
+    print_load(results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
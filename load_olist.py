@@ -0,0 +1,191 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import os
+import sqlite3
+import time
+
+import variants
+
+#--------------------------------------------------------
+#                  OLIST DATABASE LOADER
+#--------------------------------------------------------
+#Builds A3Small.db, A3Medium.db and A3Large.db from the Olist CSV dumps.
+#
+#Customers are ranked by a seeded hash of their customer_id and each database
+#takes the first N, so the samples are nested (Small is part of Medium, which
+#is part of Large) and the same seed always gives the same rows whatever the
+#order of the CSV files. Orders follow their sampled customers, order items
+#follow their orders and sellers follow the items that reference them.
+#
+#Rows are bulk inserted into key-less staging tables with journaling off in
+#one transaction, then copied in key order into the keyed tables, so each
+#primary key index is built from sorted input.
+
+CSV_FILES = {
+    "customers": "olist_customers_dataset.csv",
+    "orders": "olist_orders_dataset.csv",
+    "items": "olist_order_items_dataset.csv",
+    "sellers": "olist_sellers_dataset.csv",
+}
+
+#Customers per database. Small matches the A3Small.db in the repository.
+SIZES = {"A3Small.db": 10000, "A3Medium.db": 20000, "A3Large.db": 33000}
+
+BATCH = 50000
+
+#Same schema as A3Small.db
+SCHEMA = {
+    "Customers": '''CREATE TABLE "Customers" (
+        "customer_id"	TEXT,
+        "customer_postal_code"	INTEGER,
+        PRIMARY KEY("customer_id")
+    )''',
+    "Sellers": '''CREATE TABLE "Sellers" (
+        "seller_id"	TEXT,
+        "seller_postal_code"	INTEGER,
+        PRIMARY KEY("seller_id")
+    )''',
+    "Orders": '''CREATE TABLE "Orders" (
+        "order_id"	TEXT,
+        "customer_id"	TEXT,
+        FOREIGN KEY("customer_id") REFERENCES "Customers"("customer_id"),
+        PRIMARY KEY("order_id")
+    )''',
+    "Order_items": '''CREATE TABLE "Order_items" (
+        "order_id"	TEXT,
+        "order_item_id"	INTEGER,
+        "product_id"	TEXT,
+        "seller_id"	TEXT,
+        FOREIGN KEY("order_id") REFERENCES "Orders"("order_id"),
+        PRIMARY KEY("order_id","order_item_id","product_id","seller_id")
+    )''',
+}
+
+#Primary key of each table, used to order the copy out of staging
+KEYS = {
+    "Customers": "customer_id",
+    "Sellers": "seller_id",
+    "Orders": "order_id",
+    "Order_items": "order_id, order_item_id, product_id, seller_id",
+}
+
+#Yields each row of a CSV file as a dict
+def read_csv(path):
+    with open(path, newline='') as fl:
+        yield from csv.DictReader(fl)
+
+#Seeded rank of a key; the same (seed, key) always gives the same rank
+def priority(seed, key):
+    return hashlib.sha1("{}:{}".format(seed, key).encode()).digest()
+
+#Reads the CSVs once and returns, for the largest size, the sampled rows of
+#every table; customers are in priority order so any size is a prefix
+def sample_olist(directory, largest, seed):
+    paths = {name: os.path.join(directory, fileName) for name, fileName in CSV_FILES.items()}
+
+    #Keep only the largest customers needed, never the whole file
+    ranked = heapq.nsmallest(largest, (
+        (priority(seed, row["customer_id"]), row["customer_id"], int(row["customer_zip_code_prefix"]))
+        for row in read_csv(paths["customers"])))
+    customers = [(customerID, postal) for _, customerID, postal in ranked]
+    customerIDs = {customerID for customerID, _ in customers}
+
+    orders = [(row["order_id"], row["customer_id"]) for row in read_csv(paths["orders"])
+              if row["customer_id"] in customerIDs]
+    orderIDs = {orderID for orderID, _ in orders}
+
+    items = [(row["order_id"], int(row["order_item_id"]), row["product_id"], row["seller_id"])
+             for row in read_csv(paths["items"]) if row["order_id"] in orderIDs]
+    sellerIDs = {item[3] for item in items}
+
+    sellers = [(row["seller_id"], int(row["seller_zip_code_prefix"])) for row in read_csv(paths["sellers"])
+               if row["seller_id"] in sellerIDs]
+    return customers, orders, items, sellers
+
+#Narrows the sample to the first count customers
+def subset(sample, count):
+    customers, orders, items, sellers = sample
+    customers = customers[:count]
+    customerIDs = {customerID for customerID, _ in customers}
+    orders = [order for order in orders if order[1] in customerIDs]
+    orderIDs = {orderID for orderID, _ in orders}
+    items = [item for item in items if item[0] in orderIDs]
+    sellerIDs = {item[3] for item in items}
+    sellers = [seller for seller in sellers if seller[0] in sellerIDs]
+    return {"Customers": customers, "Orders": orders, "Order_items": items, "Sellers": sellers}
+
+#Writes the tables into a new database at path and returns per-table reports
+def write_database(path, tables):
+    connection = sqlite3.connect(path)
+    connection.isolation_level = None
+    variants.set_build_pragmas(connection)
+    reports = []
+    try:
+        connection.execute("BEGIN")
+        for table, rows in tables.items():
+            start = time.perf_counter()
+            width = len(rows[0]) if rows else len(KEYS[table].split(","))
+            connection.execute('CREATE TABLE "{}Staging" ({})'.format(
+                table, ", ".join("c{}".format(i) for i in range(width))))
+            insert = 'INSERT INTO "{}Staging" VALUES ({})'.format(table, ", ".join("?" * width))
+            for i in range(0, len(rows), BATCH):
+                connection.executemany(insert, rows[i:i + BATCH])
+
+            #Copy in key order so the primary key index is built from
+            #sorted input, then drop the staging table
+            connection.execute(SCHEMA[table])
+            columns = [row[1] for row in connection.execute('PRAGMA table_info("{}")'.format(table))]
+            keyOrder = ", ".join("c{}".format(columns.index(key.strip())) for key in KEYS[table].split(","))
+            connection.execute('INSERT INTO "{0}" SELECT * FROM "{0}Staging" ORDER BY {1}'.format(table, keyOrder))
+            connection.execute('DROP TABLE "{}Staging"'.format(table))
+            seconds = time.perf_counter() - start
+            reports.append({"table": table, "rows": len(rows), "seconds": seconds,
+                            "rows_per_s": len(rows) / seconds if seconds > 0 else 0.0})
+        connection.execute("COMMIT")
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the assignment databases from the Olist CSV files")
+    parser.add_argument("--csv-dir", default=".", help="directory holding the Olist CSV files")
+    parser.add_argument("--out-dir", default=".", help="where to write the databases")
+    parser.add_argument("--seed", default="A3", help="same seed, same databases")
+    parser.add_argument("--size", action="append", metavar="NAME=CUSTOMERS",
+                        help="database to build and its customer count (default: Small, Medium, Large)")
+    parser.add_argument("--force", action="store_true", help="overwrite existing databases")
+    args = parser.parse_args(argv)
+
+    sizes = dict(SIZES)
+    if args.size:
+        sizes = {}
+        for spec in args.size:
+            name, _, count = spec.partition("=")
+            sizes[name] = int(count)
+
+    targets = {os.path.join(args.out_dir, name): count for name, count in sizes.items()}
+    for path in targets:
+        if os.path.exists(path) and not args.force:
+            parser.error("{} exists; use --force to overwrite it".format(path))
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    sample = sample_olist(args.csv_dir, max(targets.values()), args.seed)
+    print("Sampled CSV files in {:.2f}s".format(time.perf_counter() - start))
+
+    for path, count in targets.items():
+        if os.path.exists(path):
+            os.remove(path)
+        print("Building {} ({} customers)".format(path, count))
+        for report in write_database(path, subset(sample, count)):
+            print("    {:<12} {:>9} rows in {:.3f}s ({:,.0f} rows/s)".format(
+                report["table"], report["rows"], report["seconds"], report["rows_per_s"]))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,410 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import benchmark
+import snapshots
+import stats
+
+#--------------------------------------------------------
+#                  MATERIALIZED AGGREGATES
+#--------------------------------------------------------
+#Q2 reads order sizes through the OrderSize view, which aggregates all of
+#Order_items every time it is used, and Q3 inlines the same subquery. Here
+#OrderSize is a real table keyed by order_id instead, filled once and kept
+#current by triggers on Order_items, so a query only does a primary key
+#lookup per order.
+#
+#Each trigger recounts the orders its row belongs to rather than adding or
+#subtracting one: size is COUNT(DISTINCT order_item_id) and one item id can
+#appear on several rows (one per product and seller), so whether a row
+#changes the count depends on the others. The recount uses the primary key
+#of Order_items, which starts with order_id, so it only reads that order.
+#
+#The table is created under the view's name, so Q2's SQL is unchanged; Q2's
+#setup uses CREATE VIEW IF NOT EXISTS, which is a no-op once the table exists.
+#
+#On top of it, PostalSummary keeps per postal code the number of orders, the
+#number with items and the sum of their sizes, so Q1 and Q2/Q3 become a
+#single primary key lookup (the Summary scenario). See POSTAL_SUMMARY.
+#
+#OrderSellerPostals does the same for Q4: the number of distinct seller
+#postal codes of each order (the Precomputed scenario). See SELLER_POSTALS.
+
+#Recounts the size of the order named by ref ("NEW" or "OLD") and removes it
+#if the order has no items left
+def refresh(ref):
+    return '''DELETE FROM OrderSize WHERE oid = {0}.order_id;
+              INSERT INTO OrderSize
+              SELECT {0}.order_id, COUNT(DISTINCT order_item_id)
+              FROM Order_items WHERE order_id = {0}.order_id
+              HAVING COUNT(*) > 0;'''.format(ref)
+
+ORDER_SIZE_TABLE = [
+    '''CREATE TABLE OrderSize (
+           oid TEXT PRIMARY KEY,
+           size INTEGER NOT NULL
+       ) WITHOUT ROWID''',
+    '''INSERT INTO OrderSize
+       SELECT order_id, COUNT(DISTINCT order_item_id)
+       FROM Order_items
+       GROUP BY order_id''',
+]
+
+ORDER_SIZE_TRIGGERS = [
+    '''CREATE TRIGGER OrderSizeInsert AFTER INSERT ON Order_items
+       BEGIN {} END'''.format(refresh("NEW")),
+    '''CREATE TRIGGER OrderSizeDelete AFTER DELETE ON Order_items
+       BEGIN {} END'''.format(refresh("OLD")),
+    '''CREATE TRIGGER OrderSizeUpdate AFTER UPDATE OF order_id, order_item_id ON Order_items
+       BEGIN {} {} END'''.format(refresh("OLD"), refresh("NEW")),
+]
+
+ORDER_SIZE = ORDER_SIZE_TABLE + ORDER_SIZE_TRIGGERS
+
+#Same aggregate as the view, to check the table against
+ORDER_SIZE_QUERY = '''SELECT order_id, COUNT(DISTINCT order_item_id)
+                      FROM Order_items GROUP BY order_id'''
+
+#Scenario answering Q2 from the materialized table, with the same indexes as
+#UserOptimized so only the OrderSize access differs
+#   indexes - dict of index name -> "Table (col, col)"
+def materialized_scenario(indexes):
+    return benchmark.scenario(
+        pragmas={"automatic_index": "ON"},
+        setup=["CREATE INDEX {} ON {}".format(name, on) for name, on in indexes.items()] + ORDER_SIZE,
+        expect={"require": ["INDEX {} ".format(name) for name in indexes] + ["OS USING PRIMARY KEY"],
+                "forbid": ["AUTOMATIC"]},
+    )
+
+#Returns the rows of two queries that are not in both
+def differences(connection, expected, actual):
+    return connection.execute('''SELECT * FROM ({0} EXCEPT {1})
+                                 UNION ALL
+                                 SELECT * FROM ({1} EXCEPT {0})'''.format(expected, actual)).fetchall()
+
+#Returns the orders whose materialized size differs from the aggregate
+def mismatches(connection):
+    return differences(connection, ORDER_SIZE_QUERY, "SELECT oid, size FROM OrderSize")
+
+#--------------------------------------------------------
+#                  POSTAL CODE SUMMARY
+#--------------------------------------------------------
+#PostalSummary(postal_code, orders, sized_orders, size_sum): for every
+#customer postal code, the orders of its customers, how many of them have
+#items (a row in OrderSize) and the sum of their sizes. Q1 is orders; Q2/Q3's
+#COUNT(*) and AVG(size) are sized_orders and size_sum / sized_orders.
+#
+#Every change is applied as a delta through an upsert, never by recounting
+#the postal code:
+#   OrderSize  - an order gaining, losing or changing size; this is how
+#                Order_items writes reach the summary, through the OrderSize
+#                triggers above (SQLite fires triggers for writes made by
+#                other triggers)
+#   Orders     - an order added, removed or moved to another customer
+#   Customers  - a customer added, removed or moved to another postal code,
+#                which moves all of their orders at once; the index on
+#                Orders (customer_id) keeps that to their own orders
+#Rows are left at zero rather than deleted, and a postal code with no row
+#reads as zero through MAX() over no rows.
+
+#Adds sign times the contribution selected by select (postal code, orders,
+#sized orders, size sum) to the summary
+def delta(select):
+    return '''INSERT INTO PostalSummary (postal_code, orders, sized_orders, size_sum)
+              {}
+              ON CONFLICT (postal_code) DO UPDATE SET
+                  orders = orders + excluded.orders,
+                  sized_orders = sized_orders + excluded.sized_orders,
+                  size_sum = size_sum + excluded.size_sum;'''.format(select)
+
+#Contribution of one OrderSize row to the postal code of its order's customer
+def size_delta(ref, sign):
+    return delta('''SELECT C.customer_postal_code, 0, {1}1, {1}{0}.size
+                    FROM Orders O, Customers C
+                    WHERE O.order_id = {0}.oid AND C.customer_id = O.customer_id'''.format(ref, sign))
+
+#Contribution of one order to the postal code of its customer
+def order_delta(ref, sign):
+    return delta('''SELECT C.customer_postal_code, {1}1, {1}(OS.oid IS NOT NULL), {1}COALESCE(OS.size, 0)
+                    FROM Customers C LEFT JOIN OrderSize OS ON OS.oid = {0}.order_id
+                    WHERE C.customer_id = {0}.customer_id'''.format(ref, sign))
+
+#Contribution of all of one customer's orders to their postal code
+def customer_delta(ref, sign):
+    return delta('''SELECT {0}.customer_postal_code, {1}COUNT(*), {1}COUNT(OS.oid), {1}COALESCE(SUM(OS.size), 0)
+                    FROM Orders O LEFT JOIN OrderSize OS ON OS.oid = O.order_id
+                    WHERE O.customer_id = {0}.customer_id'''.format(ref, sign))
+
+POSTAL_SUMMARY_QUERY = '''SELECT C.customer_postal_code, COUNT(*), COUNT(OS.oid), COALESCE(SUM(OS.size), 0)
+                          FROM Customers C JOIN Orders O ON O.customer_id = C.customer_id
+                          LEFT JOIN OrderSize OS ON OS.oid = O.order_id
+                          GROUP BY C.customer_postal_code'''
+
+POSTAL_SUMMARY = ORDER_SIZE + [
+    "CREATE INDEX IF NOT EXISTS summary_order_customer ON Orders (customer_id)",
+    '''CREATE TABLE PostalSummary (
+           postal_code INTEGER PRIMARY KEY,
+           orders INTEGER NOT NULL,
+           sized_orders INTEGER NOT NULL,
+           size_sum INTEGER NOT NULL
+       ) WITHOUT ROWID''',
+    "INSERT INTO PostalSummary " + POSTAL_SUMMARY_QUERY,
+    '''CREATE TRIGGER PostalSizeInsert AFTER INSERT ON OrderSize
+       BEGIN {} END'''.format(size_delta("NEW", "")),
+    '''CREATE TRIGGER PostalSizeDelete AFTER DELETE ON OrderSize
+       BEGIN {} END'''.format(size_delta("OLD", "-")),
+    '''CREATE TRIGGER PostalSizeUpdate AFTER UPDATE ON OrderSize
+       BEGIN {} {} END'''.format(size_delta("OLD", "-"), size_delta("NEW", "")),
+    '''CREATE TRIGGER PostalOrderInsert AFTER INSERT ON Orders
+       BEGIN {} END'''.format(order_delta("NEW", "")),
+    '''CREATE TRIGGER PostalOrderDelete AFTER DELETE ON Orders
+       BEGIN {} END'''.format(order_delta("OLD", "-")),
+    '''CREATE TRIGGER PostalOrderUpdate AFTER UPDATE OF order_id, customer_id ON Orders
+       BEGIN {} {} END'''.format(order_delta("OLD", "-"), order_delta("NEW", "")),
+    '''CREATE TRIGGER PostalCustomerInsert AFTER INSERT ON Customers
+       BEGIN {} END'''.format(customer_delta("NEW", "")),
+    '''CREATE TRIGGER PostalCustomerDelete AFTER DELETE ON Customers
+       BEGIN {} END'''.format(customer_delta("OLD", "-")),
+    '''CREATE TRIGGER PostalCustomerUpdate AFTER UPDATE OF customer_id, customer_postal_code ON Customers
+       BEGIN {} {} END'''.format(customer_delta("OLD", "-"), customer_delta("NEW", "")),
+]
+
+#The queries answered from the summary; MAX() over the one matching row, or
+#none, always returns exactly one row as the originals do
+SUMMARY_SQL = {
+    "Q1": '''SELECT COALESCE(MAX(orders), 0)
+             FROM PostalSummary WHERE postal_code = :code''',
+    "Q2": '''SELECT COALESCE(MAX(sized_orders), 0), CAST(MAX(size_sum) AS REAL) / MAX(sized_orders)
+             FROM PostalSummary WHERE postal_code = :code''',
+}
+SUMMARY_SQL["Q3"] = SUMMARY_SQL["Q2"]
+
+SUMMARY_BATCH_SQL = {
+    "Q1": '''SELECT P.id, COALESCE(S.orders, 0)
+             FROM Params P LEFT JOIN PostalSummary S ON S.postal_code = P.code''',
+    "Q2": '''SELECT P.id, COALESCE(S.sized_orders, 0), CAST(S.size_sum AS REAL) / S.sized_orders
+             FROM Params P LEFT JOIN PostalSummary S ON S.postal_code = P.code''',
+}
+SUMMARY_BATCH_SQL["Q3"] = SUMMARY_BATCH_SQL["Q2"]
+
+#Scenario answering a query ("Q1", "Q2" or "Q3") from PostalSummary
+def summary_scenario(name):
+    return benchmark.scenario(
+        pragmas={"automatic_index": "ON"},
+        setup=POSTAL_SUMMARY,
+        expect={"require": ["PostalSummary USING PRIMARY KEY"]},
+        sql=SUMMARY_SQL[name],
+        batch_sql=SUMMARY_BATCH_SQL[name],
+    )
+
+#Returns the postal codes whose summary differs from a full recount
+def summary_mismatches(connection):
+    return differences(connection, POSTAL_SUMMARY_QUERY,
+                       "SELECT * FROM PostalSummary WHERE orders > 0 OR sized_orders > 0 OR size_sum > 0")
+
+#--------------------------------------------------------
+#                  SELLER POSTAL CODES PER ORDER
+#--------------------------------------------------------
+#OrderSellerPostals(oid, postal_codes): for every order with items, Q4's
+#answer - the distinct postal codes of its items' sellers. Like OrderSize it
+#is a distinct count, so triggers recount the orders a change touches rather
+#than apply a delta:
+#   Order_items - the order of the changed row, read through the primary key
+#                 of Order_items (order_id first) and Sellers
+#   Sellers     - every order with an item sold by the changed seller, found
+#                 through an index on Order_items (seller_id)
+#The initial fill is one pass over Order_items in primary key order.
+
+#Counts the distinct seller postal codes of the orders selected by where
+def seller_postals(where):
+    return '''SELECT O.order_id, COUNT(DISTINCT S.seller_postal_code)
+              FROM Order_items O, Sellers S
+              WHERE S.seller_id = O.seller_id AND {}
+              GROUP BY O.order_id'''.format(where)
+
+#Recounts the order named by ref ("NEW" or "OLD"); an order with no sold
+#items gets no row
+def recount_order(ref):
+    return '''DELETE FROM OrderSellerPostals WHERE oid = {0}.order_id;
+              INSERT INTO OrderSellerPostals {1};'''.format(ref, seller_postals("O.order_id = {}.order_id".format(ref)))
+
+#Recounts every order with an item sold by the seller named by ref
+def recount_seller(ref):
+    orders = "(SELECT order_id FROM Order_items WHERE seller_id = {}.seller_id)".format(ref)
+    return '''DELETE FROM OrderSellerPostals WHERE oid IN {0};
+              INSERT INTO OrderSellerPostals {1};'''.format(orders, seller_postals("O.order_id IN " + orders))
+
+SELLER_POSTALS_QUERY = seller_postals("1")
+
+SELLER_POSTALS = [
+    "CREATE INDEX IF NOT EXISTS postals_item_seller ON Order_items (seller_id)",
+    '''CREATE TABLE OrderSellerPostals (
+           oid TEXT PRIMARY KEY,
+           postal_codes INTEGER NOT NULL
+       ) WITHOUT ROWID''',
+    "INSERT INTO OrderSellerPostals " + SELLER_POSTALS_QUERY,
+    '''CREATE TRIGGER PostalsItemInsert AFTER INSERT ON Order_items
+       BEGIN {} END'''.format(recount_order("NEW")),
+    '''CREATE TRIGGER PostalsItemDelete AFTER DELETE ON Order_items
+       BEGIN {} END'''.format(recount_order("OLD")),
+    '''CREATE TRIGGER PostalsItemUpdate AFTER UPDATE OF order_id, seller_id ON Order_items
+       BEGIN {} {} END'''.format(recount_order("OLD"), recount_order("NEW")),
+    '''CREATE TRIGGER PostalsSellerInsert AFTER INSERT ON Sellers
+       BEGIN {} END'''.format(recount_seller("NEW")),
+    '''CREATE TRIGGER PostalsSellerDelete AFTER DELETE ON Sellers
+       BEGIN {} END'''.format(recount_seller("OLD")),
+    '''CREATE TRIGGER PostalsSellerUpdate AFTER UPDATE OF seller_id, seller_postal_code ON Sellers
+       BEGIN {} {} END'''.format(recount_seller("OLD"), recount_seller("NEW")),
+]
+
+#Scenario answering Q4 from OrderSellerPostals
+def precomputed_scenario():
+    return benchmark.scenario(
+        pragmas={"automatic_index": "ON"},
+        setup=SELLER_POSTALS,
+        expect={"require": ["OrderSellerPostals USING PRIMARY KEY"]},
+        sql='''SELECT COALESCE(MAX(postal_codes), 0)
+               FROM OrderSellerPostals WHERE oid = :orderID''',
+        batch_sql='''SELECT P.id, COALESCE(T.postal_codes, 0)
+                     FROM Params P LEFT JOIN OrderSellerPostals T ON T.oid = P.orderID''',
+    )
+
+#Returns the orders whose precomputed count differs from a full recount
+def seller_postal_mismatches(connection):
+    return differences(connection, SELLER_POSTALS_QUERY, "SELECT oid, postal_codes FROM OrderSellerPostals")
+
+#--------------------------------------------------------
+#                      WRITE COST
+#--------------------------------------------------------
+
+#Writes timed, each over the first ? existing rows of its table. Inserted
+#rows copy existing ones with a new key, so they land in real orders and
+#customers; moves send orders to another customer and customers to another
+#postal code, and sellers to another postal code.
+WRITES = {
+    "insert item": '''INSERT INTO Order_items
+                      SELECT order_id, order_item_id + 1000, product_id, seller_id
+                      FROM Order_items WHERE rowid IN (SELECT rowid FROM Order_items LIMIT ?)''',
+    "update item": '''UPDATE Order_items SET order_item_id = order_item_id + 1000
+                      WHERE rowid IN (SELECT rowid FROM Order_items LIMIT ?)''',
+    "delete item": '''DELETE FROM Order_items
+                      WHERE rowid IN (SELECT rowid FROM Order_items LIMIT ?)''',
+    "insert order": '''INSERT INTO Orders
+                       SELECT order_id || '-copy', customer_id
+                       FROM Orders WHERE rowid IN (SELECT rowid FROM Orders LIMIT ?)''',
+    "move order": '''UPDATE Orders SET customer_id = (SELECT MIN(customer_id) FROM Customers)
+                     WHERE rowid IN (SELECT rowid FROM Orders LIMIT ?)''',
+    "move customer": '''UPDATE Customers SET customer_postal_code = customer_postal_code + 1
+                        WHERE rowid IN (SELECT rowid FROM Customers LIMIT ?)''',
+    "move seller": '''UPDATE Sellers SET seller_postal_code = seller_postal_code + 1
+                      WHERE rowid IN (SELECT rowid FROM Sellers LIMIT ?)''',
+}
+
+WRITE_ROWS = 1000
+WRITE_REPEATS = 5
+
+#Returns {write: median ns per row written} for every write in WRITES on a
+#snapshot; rows written by triggers are not counted, so their work shows.
+#Each write is rolled back, so the snapshot is left as it was. check is a
+#list of functions(connection) -> mismatches; each is run after the first
+#of every write and a mismatch raises RuntimeError.
+def write_costs(uri, rows=WRITE_ROWS, repeats=WRITE_REPEATS, check=()):
+    connection = sqlite3.connect(uri, uri=True)
+    connection.isolation_level = None
+    costs = {}
+    try:
+        for name, sql in WRITES.items():
+            times = []
+            for i in range(repeats):
+                connection.execute("BEGIN")
+                start = time.perf_counter_ns()
+                written = connection.execute(sql, (rows,)).rowcount
+                times.append((time.perf_counter_ns() - start) // max(written, 1))
+                for function in check if i == 0 else ():
+                    wrong = function(connection)
+                    if wrong:
+                        raise RuntimeError("{} is stale after {}: {} rows differ".format(
+                            function.__name__, name, len(wrong)))
+                connection.execute("ROLLBACK")
+            costs[name] = stats.median(times)
+    finally:
+        connection.close()
+    return costs
+
+#--------------------------------------------------------
+#                      COMPARISON
+#--------------------------------------------------------
+
+#Cells compared and their labels in the report
+COMPARED = [
+    ("Q1", "UserOptimized", "join"),
+    ("Q1", "Summary", "summary"),
+    ("Q2", "UserOptimized", "view"),
+    ("Q3", "UserOptimized", "inline"),
+    ("Q2", "Materialized", "materialized"),
+    ("Q2", "Summary", "summary"),
+    ("Q4", "UserOptimized", "covering"),
+    ("Q4", "Precomputed", "precomputed"),
+]
+
+#Times reading order counts and sizes through joins, the view, the inline
+#subquery, the materialized OrderSize and PostalSummary, and Q4 through its
+#covering indexes and OrderSellerPostals, on the same databases. Then times
+#the writes on a plain snapshot and on one per way of keeping answers fresh.
+#Returns (results, {path: {"plain": costs, variant: costs, ...}}).
+def compare(paths=benchmark.DEFAULT_PATHS, runs=benchmark.DEFAULT_RUNS, options=None):
+    options = benchmark.make_options(options)
+    queries = benchmark.load_queries()
+    results = []
+    for name, scenarioName, label in COMPARED:
+        for result in benchmark.run([queries[name]], paths, [scenarioName], runs, options):
+            result["scenario"] = label
+            results.append(result)
+
+    writes = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        writes[path] = {"plain": write_costs(snapshots.snapshot(path, [], options["snapshot"]))}
+        for variant, setup, check in write_variants(queries):
+            writes[path][variant] = write_costs(snapshots.snapshot(path, setup, options["snapshot"]), check=check)
+    return results, writes
+
+#Ways of keeping answers fresh whose write cost is compared with the plain
+#tables: (name, setup statements, consistency checks)
+def write_variants(queries):
+    return [
+        ("materialized", ORDER_SIZE, [mismatches]),
+        ("summary", POSTAL_SUMMARY, [mismatches, summary_mismatches]),
+        ("covering", queries["Q4"]["scenarios"]["UserOptimized"]["setup"], []),
+        ("precomputed", SELLER_POSTALS, [seller_postal_mismatches]),
+    ]
+
+def print_writes(writes):
+    print("\nWrite cost in us per row (up to {} rows per write, median of {}):".format(WRITE_ROWS, WRITE_REPEATS))
+    for path, costs in writes.items():
+        variants = [variant for variant in costs if variant != "plain"]
+        print("{:<20} {:<14} {:>8}".format("database", "write", "plain")
+              + "".join(" {:>16}".format(variant) for variant in variants))
+        for name in WRITES:
+            plain = costs["plain"][name]
+            cells = ["{:.2f} ({:.1f}x)".format(costs[v][name] / 1e3, costs[v][name] / plain if plain else 0.0)
+                     for v in variants]
+            print("{:<20} {:<14} {:>8.2f}".format(path, name, plain / 1e3) + "".join(" {:>16}".format(c) for c in cells))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare views, joins and indexes with materialized aggregates")
+    parser.add_argument("--db", action="append", help="database path (default: Small, Medium, Large)")
+    parser.add_argument("--runs", type=int, default=benchmark.DEFAULT_RUNS)
+    args = parser.parse_args(argv)
+
+    results, writes = compare(args.db or benchmark.DEFAULT_PATHS, args.runs)
+    benchmark.print_results(results)
+    print_writes(writes)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+import concurrent.futures
+import multiprocessing
+import multiprocessing.util
+import os
+
+import benchmark
+import snapshots
+
+#--------------------------------------------------------
+#                  PARALLEL EXECUTOR
+#--------------------------------------------------------
+#Runs benchmark cells - one (query, database, scenario) each - in a process
+#pool. Every cell works on its own snapshot, so cells are independent; the
+#results come back in the same order and shape as a serial run.
+
+#Queries of the current run, looked up by name in the workers. Forked
+#workers inherit this; spawned ones fall back to benchmark.load_queries().
+_queries = {}
+
+#Warns that cells timed at the same time compete for disk, memory bandwidth
+#and CPU caches, so their latencies are not those of an idle machine
+def warn_concurrency(options):
+    cpus = os.cpu_count() or 1
+    print("WARNING: running {} cells at once on {} CPUs.".format(options["jobs"], cpus))
+    if options["serialize_timing"]:
+        print("         Only snapshot builds overlap; timed phases run one at a time.")
+        return
+    print("         Concurrent I/O and shared caches can distort the timings;")
+    print("         use --serialize-timing to overlap only the setup.")
+    if options["jobs"] > cpus:
+        print("         More jobs than CPUs: cells will also compete for cores.")
+
+#Runs in each worker when it starts. A forked worker inherits the parent's
+#snapshot cache, so it starts its own; its snapshots are reused by every cell
+#it runs and deleted when it exits. Pool workers exit without running atexit
+#handlers, so the cleanup is a multiprocessing finalizer instead.
+def init_worker(lock, counter, pin):
+    benchmark.TIMING_LOCK = lock
+    snapshots.forget()
+    multiprocessing.util.Finalize(None, snapshots.clear, exitpriority=10)
+    if pin and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+
+def run_job(name, path, scenarioName, params, options):
+    query = _queries.get(name) or benchmark.load_queries()[name]
+    return benchmark.run_cell(query, path, scenarioName, params, options)
+
+#Runs every (query, path, scenario, params) cell with options["jobs"]
+#workers and returns the results in cell order
+def run_cells(cells, options):
+    warn_concurrency(options)
+    _queries.clear()
+    for query, _, _, _ in cells:
+        _queries[query["name"]] = query
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    lock = context.Lock() if options["serialize_timing"] else None
+    counter = context.Value("i", 0)
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=options["jobs"], mp_context=context,
+            initializer=init_worker, initargs=(lock, counter, options["pin"])) as pool:
+        futures = []
+        for query, path, scenarioName, params in cells:
+            futures.append(pool.submit(run_job, query["name"], path, scenarioName, params, options))
+
+        results = []
+        for (query, path, scenarioName, _), future in zip(cells, futures):
+            results.append(future.result())
+            print("    Finished {} on {}: {}".format(query["name"], path, scenarioName))
+    return results
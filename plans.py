@@ -0,0 +1,58 @@
+import sqlite3
+
+#--------------------------------------------------------
+#                      QUERY PLANS
+#--------------------------------------------------------
+#Captures EXPLAIN QUERY PLAN for every benchmark cell and checks it against
+#what the scenario expects, so a number measured with an unexpected plan
+#(a SCAN where an index was meant to be used, an AUTOMATIC INDEX in the
+#uninformed run) is flagged instead of silently trusted.
+#
+#Scenario expectations are plain data:
+#   {"require": ["INDEX customersIndex", ...],  - must appear in the plan
+#    "forbid": ["AUTOMATIC", ...]}              - must not appear in the plan
+
+#Returns the plan as a list of lines, indented to show the tree
+def explain(cursor, sql, params):
+    rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    depth = {0: -1}
+    lines = []
+    for nodeID, parentID, _, detail in rows:
+        depth[nodeID] = depth.get(parentID, -1) + 1
+        lines.append("  " * depth[nodeID] + detail)
+    return lines
+
+#Returns a description of every way plan differs from expect
+def check_plan(plan, expect):
+    text = "\n".join(plan)
+    problems = []
+    for needed in expect.get("require", []):
+        if needed not in text:
+            problems.append("expected {!r} in plan".format(needed))
+    for unwanted in expect.get("forbid", []):
+        for line in plan:
+            if unwanted in line:
+                problems.append("unexpected {!r}: {}".format(unwanted, line.strip()))
+    return problems
+
+#Names of every PRAGMA this SQLite build knows
+def known_pragmas():
+    connection = sqlite3.connect(":memory:")
+    try:
+        return {row[0] for row in connection.execute("PRAGMA pragma_list")}
+    finally:
+        connection.close()
+
+#SQLite ignores PRAGMAs it does not know without any error, so a misspelled
+#one silently changes nothing. Raises ValueError naming every unknown one.
+def validate_pragmas(names):
+    unknown = sorted(set(names) - known_pragmas())
+    if unknown:
+        raise ValueError("unknown PRAGMA(s): {}".format(", ".join(unknown)))
+
+def print_plan(result):
+    print("    {} {} {}".format(result["query"], result["db"], result["scenario"]))
+    for line in result["plan"]:
+        print("        " + line)
+    for problem in result["plan_problems"]:
+        print("        ! " + problem)
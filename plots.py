@@ -0,0 +1,141 @@
+import os
+
+#--------------------------------------------------------
+#                      CHARTS
+#--------------------------------------------------------
+#Charts are drawn from benchmark result dicts, or records loaded back from
+#the results file (see history.py and report.py). Latencies are stored in
+#nanoseconds and shown in milliseconds.
+#
+#matplotlib is only imported when a chart is drawn, with the Agg backend, so
+#nothing needs a display and runs that draw nothing never pay for the import.
+#Charts are only ever written to files, never shown in a window.
+
+COLOURS = {"Uninformed": "blue", "SelfOptimized": "red", "UserOptimized": "green", "Cached": "orange",
+           "Columnar": "purple"}
+
+_plt = None
+
+#matplotlib.pyplot, imported on first use with the non-interactive Agg backend
+def pyplot():
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot
+        _plt = matplotlib.pyplot
+    return _plt
+
+#Labels a database path for the chart, e.g. "./A3Small.db" -> "SmallDB"
+def db_label(path):
+    name = path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    if name.startswith("A3"):
+        name = name[2:]
+    return name + "DB"
+
+#Returns the databases and scenarios in the order they were run, and the
+#results keyed by (database, scenario)
+def layout(results):
+    dbs = []
+    scenarios = []
+    cells = {}
+    for result in results:
+        if result["db"] not in dbs:
+            dbs.append(result["db"])
+        if result["scenario"] not in scenarios:
+            scenarios.append(result["scenario"])
+        cells[(result["db"], result["scenario"])] = result
+    return dbs, scenarios, cells
+
+#Writes a figure in the format named by the extension of path (.png, .svg,
+#.pdf, ...) and closes it
+def save(fig, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fig.savefig(path, bbox_inches="tight")
+    print("Chart saved to file {}".format(path))
+    pyplot().close(fig)
+
+#Draws the median of each scenario side by side per database, with the
+#bootstrap confidence interval as error bars, on a log scale since scenarios
+#differ by orders of magnitude
+def grouped_bar(results, title, path):
+    dbs, scenarios, cells = layout(results)
+    fig, ax = pyplot().subplots()
+
+    width = 0.8 / max(len(scenarios), 1)
+    for i, scenarioName in enumerate(scenarios):
+        xs = [d + (i - (len(scenarios) - 1) / 2) * width for d in range(len(dbs))]
+        medians = []
+        errors = [[], []]
+        for db in dbs:
+            summary = cells[(db, scenarioName)]["summary"] if (db, scenarioName) in cells else None
+            if summary is None:
+                medians.append(0.0)
+                errors[0].append(0.0)
+                errors[1].append(0.0)
+                continue
+            medians.append(summary["median"] / 1e6)
+            errors[0].append((summary["median"] - summary["ci_low"]) / 1e6)
+            errors[1].append((summary["ci_high"] - summary["median"]) / 1e6)
+        ax.bar(xs, medians, width, yerr=errors, capsize=3, label=scenarioName, color=COLOURS.get(scenarioName))
+
+    #add labels and the legend
+    ax.set_xticks(range(len(dbs)))
+    ax.set_xticklabels([db_label(db) for db in dbs])
+    ax.set_yscale("log")
+    ax.set_ylabel("Median Run Time (ms, 95% CI)")
+    ax.set_title(title)
+    ax.legend()
+    save(fig, path)
+
+#Draws the full distribution of run times of every (database, scenario) cell
+def box_plot(results, title, path):
+    dbs, scenarios, cells = layout(results)
+    fig, ax = pyplot().subplots()
+
+    data = []
+    labels = []
+    for db in dbs:
+        for scenarioName in scenarios:
+            if (db, scenarioName) in cells:
+                data.append([t / 1e6 for t in cells[(db, scenarioName)]["times"]])
+                labels.append("{}\n{}".format(db_label(db), scenarioName))
+
+    #Labels are set apart: boxplot's own keyword for them was renamed in
+    #matplotlib 3.9
+    ax.boxplot(data, whis=(5, 95), showfliers=True)
+    ax.set_xticks(range(1, len(labels) + 1))
+    ax.set_xticklabels(labels)
+    ax.set_yscale("log")
+    ax.set_ylabel("Run Time (ms)")
+    ax.set_title(title)
+    ax.tick_params(axis="x", labelsize=7)
+    save(fig, path)
+
+#Draws median latency against database size (the "rows" of each result) on
+#log-log axes, one line per query and scenario, with the bootstrap CI as
+#error bars
+def scaling_curve(results, title, path):
+    lines = {}
+    for result in results:
+        lines.setdefault((result["query"], result["scenario"]), []).append(result)
+
+    fig, ax = pyplot().subplots()
+    for (queryName, scenarioName), cells in lines.items():
+        cells = sorted(cells, key=lambda r: r["rows"])
+        xs = [r["rows"] for r in cells]
+        medians = [r["summary"]["median"] / 1e6 for r in cells]
+        errors = [[(r["summary"]["median"] - r["summary"]["ci_low"]) / 1e6 for r in cells],
+                  [(r["summary"]["ci_high"] - r["summary"]["median"]) / 1e6 for r in cells]]
+        ax.errorbar(xs, medians, yerr=errors, marker="o", capsize=3,
+                    label="{} {}".format(queryName, scenarioName), color=COLOURS.get(scenarioName) if len(set(q for q, _ in lines)) == 1 else None)
+
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("Orders")
+    ax.set_ylabel("Median Run Time (ms, 95% CI)")
+    ax.set_title(title)
+    ax.legend(fontsize=7)
+    save(fig, path)
@@ -1,27 +1,116 @@
+import argparse
 import csv
 import random
-# resources: 
+import sqlite3
+
+from samplers import new_reservoir, offer, reservoir
+
+# resources:
 # https://docs.python.org/3/library/random.html?highlight=random#module-random
 # https://docs.python.org/3/library/csv.html?highlight=csv#module-csv
+# Li, "Reservoir-sampling algorithms of time complexity O(n(1 + log(N/n)))" (Algorithm L)
 
 file_in = "olist_customers_dataset.csv" # input file name
 file_out = "sample_small_olist_customers_dataset.csv" # output file name
 k = 10000 # number of rows sampled from population
-rows = []
 
-with open(file_in, newline = '') as fl:
-    reader = csv.reader(fl)
+# Streams the rows of a CSV file; the file is never held in memory
+def read_rows(path):
+    with open(path, newline = '') as fl:
+        reader = csv.reader(fl)
+        header = next(reader)
+        yield header
+        yield from reader
+
+# Uniform sample of k rows in one pass, keeping only k rows in memory
+def sample_rows(rows, k, rng = random):
+    return reservoir(rows, k, rng)
+
+# Share of k for each stratum, proportional to its row count, by largest
+# remainder so the shares add up to exactly k (or every row, if fewer)
+def stratum_sizes(counts, k):
+    total = sum(counts.values())
+    if total == 0:
+        return {}
+    quotas = {key: k * n / total for key, n in counts.items()}
+    sizes = {key: int(q) for key, q in quotas.items()}
+    leftover = min(k, total) - sum(sizes.values())
+    for key in sorted(quotas, key = lambda key: quotas[key] - sizes[key], reverse = True)[:leftover]:
+        sizes[key] += 1
+    return sizes
+
+# Stratified sample of k rows of the CSV file at path: each value of column
+# index gets a share of k proportional to how many rows have it. Two streaming
+# passes: the first only counts rows per stratum, the second fills one
+# Algorithm L reservoir per stratum, sized to its share. Memory is k rows plus
+# a count per stratum, however many strata (zip prefixes, cities) there are.
+def stratified_sample(path, k, index, rng = random):
+    counts = {}
+    rows = read_rows(path)
+    next(rows)
+    for row in rows:
+        counts[row[index]] = counts.get(row[index], 0) + 1
+
+    reservoirs = {key: new_reservoir(size, rng) for key, size in stratum_sizes(counts, k).items() if size}
+    rows = read_rows(path)
+    next(rows)
+    for row in rows:
+        state = reservoirs.get(row[index])
+        if state is not None:
+            offer(state, row)
+
+    result = []
+    for state in reservoirs.values():
+        result += state["sample"]
+    return result
+
+def write_csv(path, header, sample):
+    with open(path, 'w', newline='') as fl:
+        writer = csv.writer(fl)
+        writer.writerow(header)
+        for row in sample:
+            writer.writerow(row)
+
+# Writes the sample into a table named after the CSV header's columns,
+# creating it if needed
+def write_sqlite(path, table, header, sample):
+    connection = sqlite3.connect(path)
+    columns = ", ".join('"{}"'.format(name) for name in header)
+    connection.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(table, columns))
+    connection.executemany('INSERT INTO "{}" VALUES ({})'.format(table, ", ".join("?" * len(header))), sample)
+    connection.commit()
+    connection.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Sample rows of a CSV file without loading it into memory")
+    parser.add_argument("--input", default = file_in)
+    parser.add_argument("--output", default = file_out, help = "CSV file to write")
+    parser.add_argument("-k", type = int, default = k, help = "number of rows to sample")
+    parser.add_argument("--stratify", help = "column to stratify by, e.g. customer_state")
+    parser.add_argument("--seed", type = int)
+    parser.add_argument("--sqlite", help = "write into this SQLite database instead of a CSV")
+    parser.add_argument("--table", help = "table to write with --sqlite (default: the input file name)")
+    args = parser.parse_args(argv)
 
-    for row in reader:
-        rows.append(row)
+    rng = random.Random(args.seed)
+    rows = read_rows(args.input)
+    header = next(rows)
 
-sample = random.sample(rows[1:], k)
+    if args.stratify:
+        if args.stratify not in header:
+            parser.error("no column {} in {}".format(args.stratify, args.input))
+        sample = stratified_sample(args.input, args.k, header.index(args.stratify), rng)
+    else:
+        sample = sample_rows(rows, args.k, rng)
 
-with open(file_out, 'w', newline='') as fl:
-    writer = csv.writer(fl)
-    writer.writerow(rows[0])
-    for row in sample:
-        writer.writerow(row)
+    if args.sqlite:
+        table = args.table or args.input.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        write_sqlite(args.sqlite, table, header, sample)
+        print("Finished writing table {} in {}".format(table, args.sqlite))
+    else:
+        write_csv(args.output, header, sample)
+        print("Finished writing file")
 
-print("Finished writing file")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import html
+import os
+
+import history
+
+#--------------------------------------------------------
+#                      REPORTING
+#--------------------------------------------------------
+#Turns a run saved in the results file (see history.py) into charts, apart
+#from measuring: benchmarks never need matplotlib, and charts can be redrawn
+#from old runs. For every query of the run it draws
+#   bars    - median per database and scenario with its CI (plots.grouped_bar)
+#   box     - distribution of every cell's run times (plots.box_plot)
+#   scaling - latency against size, for runs made by synth.py
+#                                               (plots.scaling_curve)
+#as PNG and/or SVG files, and with html a page holding the charts and a
+#table of every cell.
+
+FORMATS = ["png", "svg", "html"]
+
+DEFAULT_DIR = "./reports"
+
+#Draws every chart of a run's records into directory in one image format and
+#returns the paths written
+def draw_charts(records, directory, extension):
+    import plots
+    runID = records[0]["run_id"]
+    paths = []
+    queries = []
+    for record in records:
+        if record["query"] not in queries:
+            queries.append(record["query"])
+    for query in queries:
+        cells = [record for record in records if record["query"] == query]
+        base = os.path.join(directory, "{}-{}".format(runID, query))
+        if any("rows" in record for record in cells):
+            plots.scaling_curve(cells, "{} latency against database size".format(query), base + "-scaling." + extension)
+            paths.append(base + "-scaling." + extension)
+            continue
+        plots.grouped_bar(cells, "{} (median, ms)".format(query), base + "-bars." + extension)
+        plots.box_plot(cells, "{} (run times, ms)".format(query), base + "-box." + extension)
+        paths += [base + "-bars." + extension, base + "-box." + extension]
+    return paths
+
+#Writes an HTML page for a run with its charts (as SVG files beside it) and
+#a table of every cell, and returns its path
+def write_html(records, directory):
+    charts = draw_charts(records, directory, "svg")
+    first = records[0]
+    path = os.path.join(directory, "{}.html".format(first["run_id"]))
+    rows = []
+    for record in records:
+        summary = record["summary"]
+        rows.append("<tr>" + "".join("<td>{}</td>".format(html.escape(str(value))) for value in [
+            record["query"], record["db"], record["scenario"], record["runs"],
+            "{:.4f}".format(summary["median"] / 1e6), "{:.4f}".format(summary["p95"] / 1e6),
+            "[{:.4f}, {:.4f}]".format(summary["ci_low"] / 1e6, summary["ci_high"] / 1e6),
+            "; ".join(record["plan_problems"]) or "",
+        ]) + "</tr>")
+    with open(path, "w") as fl:
+        fl.write('''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Benchmark run {run}</title>
+<style>body {{ font-family: sans-serif; }} table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 2px 6px; text-align: right; }}</style></head>
+<body>
+<h1>Benchmark run {run}</h1>
+<p>{label}commit {commit}{dirty}, SQLite {sqlite}, Python {python}, recorded {recorded}</p>
+<table>
+<tr><th>query</th><th>database</th><th>scenario</th><th>runs</th><th>median ms</th><th>p95 ms</th>
+<th>median 95% CI</th><th>plan problems</th></tr>
+{rows}
+</table>
+{charts}
+</body></html>
+'''.format(run=html.escape(first["run_id"]),
+           label="label {}, ".format(html.escape(first["label"])) if first["label"] else "",
+           commit=html.escape(first["git_commit"] or "unknown"), dirty=" (with local changes)" if first["git_dirty"] else "",
+           sqlite=html.escape(first["sqlite_version"]), python=html.escape(first["python"]),
+           recorded=html.escape(first["recorded"]), rows="\n".join(rows),
+           charts="\n".join('<p><img src="{}"></p>'.format(html.escape(os.path.basename(chart))) for chart in charts)))
+    print("Report saved to file {}".format(path))
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Draw charts from saved benchmark runs")
+    parser.add_argument("--file", default=history.DEFAULT_PATH, help="results file written by benchmark.py")
+    parser.add_argument("--run", action="append", help="run id, label or -N (default: latest)")
+    parser.add_argument("--format", action="append", choices=FORMATS, help="png, svg or html (default: png)")
+    parser.add_argument("--out-dir", default=DEFAULT_DIR, help="where to write the charts")
+    args = parser.parse_args(argv)
+
+    records = history.load(args.file)
+    for spec in args.run or ["latest"]:
+        try:
+            run = history.select(records, spec)
+        except ValueError as error:
+            parser.error(str(error))
+        for fmt in args.format or ["png"]:
+            if fmt == "html":
+                write_html(run, args.out_dir)
+            else:
+                draw_charts(run, args.out_dir, fmt)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+import collections
+import sys
+import time
+
+#--------------------------------------------------------
+#                      RESULT CACHE
+#--------------------------------------------------------
+#An LRU cache of query results, with an optional time to live, held in front
+#of a connection. Hot keys repeat constantly in production, so a repeated
+#(sql, parameters) pair is answered from memory instead of by SQLite.
+#
+#A cached result is never stale: before every lookup the cache reads
+#PRAGMA data_version, which changes when any other connection commits to the
+#database, and connection.total_changes, which counts this connection's own
+#writes. If either moved since the last lookup the whole cache is dropped.
+#Both are database wide - SQLite keeps no per-table counter - so a write to
+#any table empties the cache; that costs hits, never correctness.
+#
+#A cache is a plain dict:
+#   {"capacity": 1024, "ttl": None, "entries": OrderedDict(key -> (rows,
+#    stored at, bytes)), "bytes": 0, "version": None, "hits": 0, "misses": 0,
+#    "expired": 0, "evicted": 0, "invalidations": 0}
+
+DEFAULT_SETTINGS = {
+    #Results kept at most; the least recently used is dropped first
+    "capacity": 1024,
+    #Seconds a result may be served for, or None to keep it until evicted
+    #or invalidated
+    "ttl": None,
+}
+
+def make_cache(capacity=DEFAULT_SETTINGS["capacity"], ttl=DEFAULT_SETTINGS["ttl"]):
+    return {
+        "capacity": capacity,
+        "ttl": ttl,
+        "entries": collections.OrderedDict(),
+        "bytes": 0,
+        "version": None,
+        "hits": 0,
+        "misses": 0,
+        "expired": 0,
+        "evicted": 0,
+        "invalidations": 0,
+    }
+
+def clear(cache):
+    cache["entries"].clear()
+    cache["bytes"] = 0
+
+#Version of the database as seen by connection; changes whenever any
+#connection writes to it
+def data_version(connection):
+    return connection.execute("PRAGMA data_version").fetchone()[0], connection.total_changes
+
+#Approximate bytes held by a key or a result: the containers and every value
+#in them
+def footprint(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(footprint(item) for item in value)
+    return size
+
+def make_key(sql, params):
+    if isinstance(params, dict):
+        return sql, tuple(sorted(params.items()))
+    return sql, tuple(params)
+
+#Returns the rows of sql with params, from the cache when it holds a current
+#result and otherwise by running it on cursor and storing the rows
+def execute(cache, cursor, sql, params):
+    version = data_version(cursor.connection)
+    if version != cache["version"]:
+        if cache["entries"]:
+            cache["invalidations"] += 1
+            clear(cache)
+        cache["version"] = version
+
+    key = make_key(sql, params)
+    entries = cache["entries"]
+    entry = entries.get(key)
+    now = time.monotonic()
+    if entry is not None:
+        if cache["ttl"] is None or now - entry[1] <= cache["ttl"]:
+            entries.move_to_end(key)
+            cache["hits"] += 1
+            return entry[0]
+        cache["expired"] += 1
+        cache["bytes"] -= entries.pop(key)[2]
+
+    cache["misses"] += 1
+    rows = cursor.execute(sql, params).fetchall()
+    size = footprint(key) + footprint(rows)
+    entries[key] = (rows, now, size)
+    cache["bytes"] += size
+    while len(entries) > cache["capacity"]:
+        cache["bytes"] -= entries.popitem(last=False)[1][2]
+        cache["evicted"] += 1
+    return rows
+
+#Counters of a cache as a plain dict for reports
+def cache_stats(cache):
+    lookups = cache["hits"] + cache["misses"]
+    return {
+        "capacity": cache["capacity"],
+        "ttl": cache["ttl"],
+        "hits": cache["hits"],
+        "misses": cache["misses"],
+        "hit_rate": cache["hits"] / lookups if lookups else 0.0,
+        "expired": cache["expired"],
+        "evicted": cache["evicted"],
+        "invalidations": cache["invalidations"],
+        "entries": len(cache["entries"]),
+        "bytes": cache["bytes"],
+    }
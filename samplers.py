@@ -0,0 +1,228 @@
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+
+#--------------------------------------------------------
+#                  PARAMETER SAMPLERS
+#--------------------------------------------------------
+#Draw query parameters without sorting or loading whole tables. A sampler is
+#function(cursor, count) -> [{param: value}, ...], as benchmark.make_query
+#expects.
+#
+#Methods
+#   rowid     - pick random rowids between MIN(rowid) and MAX(rowid) and look
+#               each up; O(k log n). Falls back to reservoir when the rowids
+#               are too sparse.
+#   reservoir - one streaming pass over the column keeping only k values
+#               (Algorithm L); O(n) time, O(k) memory.
+#Both pick rows uniformly, so a key is drawn as often as it occurs.
+#
+#Distributions of the drawn keys
+#   frequency - keys weighted by how often they occur in the table (the rowid
+#               or reservoir method above); what the original scripts did
+#   uniform   - every distinct key equally likely
+#   zipf      - the key of popularity rank r has weight 1 / r**s; ranks are a
+#               seeded shuffle of the distinct keys
+#   hotkey    - hot_fraction of the distinct keys receive hot_share of the
+#               draws, the rest share what is left
+#   replay    - values read in order from a log file, one JSON value (or bare
+#               string) per line, repeated if the log is too short
+
+SAMPLE_METHODS = ["rowid", "reservoir"]
+DISTRIBUTIONS = ["frequency", "uniform", "zipf", "hotkey", "replay"]
+
+#Settings a sampler uses unless overridden
+DEFAULT_SAMPLING = {
+    "distribution": "frequency",
+    "method": "rowid",
+    "seed": None,
+    "s": 1.1,
+    "hot_fraction": 0.01,
+    "hot_share": 0.9,
+    "log": None,
+}
+
+#Rows fetched per fetchmany() while streaming
+FETCH_SIZE = 10000
+
+#Distinct key sets, keyed by (file fingerprint, table, column)
+_distinct = {}
+
+#Cheap identity of a database file: path, size and modification time. Any
+#write to the file changes it, which invalidates what was memoized for it.
+def fingerprint(path):
+    info = os.stat(path)
+    return (os.path.abspath(path), info.st_size, info.st_mtime_ns)
+
+#Path of the main database of a cursor's connection ("" for in-memory)
+def database_path(cursor):
+    for _, name, path in cursor.execute("PRAGMA database_list").fetchall():
+        if name == "main":
+            return path
+    return ""
+
+#Yields every row of a cursor, fetching in batches
+def stream(cursor):
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+#Algorithm L (Li, 1994): uniform sample of k items from an iterable of
+#unknown length in one pass, skipping ahead geometrically so most items are
+#never looked at twice
+def reservoir(items, k, rng=random):
+    items = iter(items)
+    sample = []
+    for item in items:
+        sample.append(item)
+        if len(sample) == k:
+            break
+    if len(sample) < k or k == 0:
+        return sample
+
+    w = math.exp(math.log(rng.random()) / k)
+    while True:
+        skip = math.floor(math.log(rng.random()) / math.log(1 - w))
+        try:
+            for _ in range(skip):
+                next(items)
+            item = next(items)
+        except StopIteration:
+            return sample
+        sample[rng.randrange(k)] = item
+        w *= math.exp(math.log(rng.random()) / k)
+
+#Algorithm L fed one item at a time, for when several reservoirs share one
+#stream (e.g. one per stratum). A reservoir is a plain dict made by
+#new_reservoir; offer() each item of its stream, then read "sample". Skipped
+#items cost a counter decrement and no random draw.
+def new_reservoir(k, rng=random):
+    return {"k": k, "rng": rng, "sample": [], "w": 1.0, "skip": 0}
+
+def next_skip(state):
+    rng = state["rng"]
+    state["w"] *= math.exp(math.log(rng.random()) / state["k"])
+    state["skip"] = math.floor(math.log(rng.random()) / math.log(1 - state["w"]))
+
+def offer(state, item):
+    sample = state["sample"]
+    if len(sample) < state["k"]:
+        sample.append(item)
+        if len(sample) == state["k"]:
+            next_skip(state)
+    elif state["skip"] > 0:
+        state["skip"] -= 1
+    else:
+        sample[state["rng"].randrange(state["k"])] = item
+        next_skip(state)
+
+def reservoir_sample(cursor, table, column, k, rng=random):
+    cursor.execute('SELECT "{}" FROM "{}"'.format(column, table))
+    return [row[0] for row in reservoir(stream(cursor), k, rng)]
+
+#Samples k values of table.column by looking up random rowids. Draws
+#without replacement while the table has at least k rows.
+def rowid_sample(cursor, table, column, k, rng=random):
+    low, high = cursor.execute('SELECT MIN(rowid), MAX(rowid) FROM "{}"'.format(table)).fetchone()
+    if low is None:
+        return []
+
+    lookup = 'SELECT "{}" FROM "{}" WHERE rowid = ?'.format(column, table)
+    span = high - low + 1
+    seen = set()
+    values = []
+    attempts = 0
+    while len(values) < k:
+        attempts += 1
+        #Too many misses means the rowids are sparse (many deleted rows)
+        if attempts > 20 * k + 100:
+            return reservoir_sample(cursor, table, column, k, rng)
+        rowid = low + rng.randrange(span)
+        if rowid in seen and len(seen) < span:
+            continue
+        row = cursor.execute(lookup, (rowid,)).fetchone()
+        if row is None:
+            continue
+        seen.add(rowid)
+        values.append(row[0])
+    return values
+
+#Every distinct value of table.column, memoized per database fingerprint
+def distinct_keys(cursor, table, column):
+    path = database_path(cursor)
+    key = (fingerprint(path) if path else id(cursor.connection), table, column)
+    if key not in _distinct:
+        cursor.execute('SELECT DISTINCT "{}" FROM "{}"'.format(column, table))
+        _distinct[key] = [row[0] for row in stream(cursor)]
+    return _distinct[key]
+
+#Draws k keys with weights 1 / rank**s
+def zipf_sample(keys, k, s, rng=random):
+    ranked = list(keys)
+    rng.shuffle(ranked)
+    cumulative = list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, len(ranked) + 1)))
+    return [ranked[bisect.bisect_left(cumulative, rng.random() * cumulative[-1])] for _ in range(k)]
+
+#Draws k keys so that hotFraction of the keys get hotShare of the draws
+def hotkey_sample(keys, k, hotFraction, hotShare, rng=random):
+    ranked = list(keys)
+    rng.shuffle(ranked)
+    hotCount = max(1, int(len(ranked) * hotFraction))
+    hot, cold = ranked[:hotCount], ranked[hotCount:] or ranked[:hotCount]
+    return [rng.choice(hot if rng.random() < hotShare else cold) for _ in range(k)]
+
+#Reads k values from a log, one per line, starting over if it runs out
+def replay_sample(path, k):
+    values = []
+    with open(path) as log:
+        for line in log:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                values.append(json.loads(line))
+            except ValueError:
+                values.append(line)
+    if not values:
+        raise ValueError("replay log {} is empty".format(path))
+    return list(itertools.islice(itertools.cycle(values), k))
+
+#Returns a sampler drawing count values of table.column, passed to the
+#query as the named parameter param. settings are any of DEFAULT_SAMPLING;
+#the benchmark can override them per run by passing them to the sampler.
+def column_sampler(table, column, param, **settings):
+    defaults = dict(DEFAULT_SAMPLING)
+    defaults.update(settings)
+
+    def sample(cursor, count, **overrides):
+        config = dict(defaults)
+        config.update(overrides)
+        if config["method"] not in SAMPLE_METHODS:
+            raise ValueError("unknown sample method {!r}".format(config["method"]))
+        if config["distribution"] not in DISTRIBUTIONS:
+            raise ValueError("unknown distribution {!r}".format(config["distribution"]))
+
+        rng = random.Random(config["seed"])
+        distribution = config["distribution"]
+        if distribution == "frequency" and config["method"] == "rowid":
+            values = rowid_sample(cursor, table, column, count, rng)
+        elif distribution == "frequency":
+            values = reservoir_sample(cursor, table, column, count, rng)
+        elif distribution == "uniform":
+            values = rng.choices(distinct_keys(cursor, table, column), k=count)
+        elif distribution == "zipf":
+            values = zipf_sample(distinct_keys(cursor, table, column), count, config["s"], rng)
+        elif distribution == "hotkey":
+            values = hotkey_sample(distinct_keys(cursor, table, column), count,
+                                   config["hot_fraction"], config["hot_share"], rng)
+        else:
+            if not config["log"]:
+                raise ValueError("the replay distribution needs a log file")
+            values = replay_sample(config["log"], count)
+        return [{param: value} for value in values]
+    return sample
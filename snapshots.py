@@ -0,0 +1,134 @@
+import atexit
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import urllib.parse
+
+import variants
+
+#--------------------------------------------------------
+#                  SCENARIO SNAPSHOTS
+#--------------------------------------------------------
+#Every scenario runs on its own copy of the pristine database, made with the
+#sqlite3 backup API and then altered by the scenario: tables rebuilt without
+#keys (see variants.py), then its DDL. Copies are built once and cached by
+#(source path, scenario, source schema), so 50 runs - or several queries
+#sharing a scenario - pay the copy cost once. The source .db file is only
+#ever opened read-only.
+
+#Where snapshots live
+#   file   - a file in a private temp directory; needed for cold-cache runs
+#   memory - a shared-cache in-memory database, kept alive by a held connection
+SNAPSHOT_KINDS = ["file", "memory"]
+
+_snapshots = {}
+_builds = {}
+_keepAlive = {}
+_workDir = None
+
+#Opens a database read-only, so it can never be modified by accident
+def connect_readonly(path):
+    uri = "file:{}?mode=ro".format(urllib.parse.quote(os.path.abspath(path)))
+    return sqlite3.connect(uri, uri=True)
+
+#Hash of the schema of a database, so a cached snapshot is rebuilt if the
+#source schema changes
+def schema_hash(path):
+    connection = connect_readonly(path)
+    try:
+        rows = connection.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+    finally:
+        connection.close()
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+def statements_hash(statements, unkeyed=None):
+    return hashlib.sha1(("\n;\n".join(statements) + repr(sorted((unkeyed or {}).items()))).encode()).hexdigest()
+
+def work_dir():
+    global _workDir
+    if _workDir is None:
+        _workDir = tempfile.mkdtemp(prefix="a3snapshots-")
+    return _workDir
+
+#Returns a URI for a copy of the database at path with the tables in unkeyed
+#({table: [(column, type), ...]}) rebuilt without keys and statements
+#applied, building it on first use. Open it with sqlite3.connect(uri, uri=True).
+def snapshot(path, statements, kind="file", unkeyed=None):
+    if kind not in SNAPSHOT_KINDS:
+        raise ValueError("unknown snapshot kind {!r}".format(kind))
+
+    key = (os.path.abspath(path), statements_hash(statements, unkeyed), schema_hash(path), kind)
+    if key in _snapshots:
+        return _snapshots[key]
+
+    name = "{}-{}".format(os.path.splitext(os.path.basename(path))[0], hashlib.sha1(repr(key).encode()).hexdigest()[:12])
+    if kind == "file":
+        uri = "file:{}".format(urllib.parse.quote(os.path.join(work_dir(), name + ".db")))
+    else:
+        uri = "file:{}?mode=memory&cache=shared".format(name)
+
+    source = connect_readonly(path)
+    target = sqlite3.connect(uri, uri=True)
+    reports = []
+    try:
+        source.backup(target)
+        variants.set_build_pragmas(target)
+        for table, columns in (unkeyed or {}).items():
+            reports.append(variants.build_unkeyed(target, table, columns))
+            variants.print_build(reports[-1])
+        for statement in statements:
+            start = time.perf_counter()
+            target.execute(statement)
+            reports.append({"statement": " ".join(statement.split()), "seconds": time.perf_counter() - start})
+        target.commit()
+    except Exception:
+        target.close()
+        raise
+    finally:
+        source.close()
+
+    #An in-memory database disappears with its last connection
+    if kind == "memory":
+        _keepAlive[key] = target
+    else:
+        target.close()
+
+    _snapshots[key] = uri
+    _builds[uri] = reports
+    return uri
+
+#Returns the build reports of a snapshot: one per table rebuilt without keys
+#(see variants.build_unkeyed), then {"statement", "seconds"} per statement
+def build_reports(uri):
+    return _builds.get(uri, [])
+
+#Returns the file behind a file snapshot URI
+def snapshot_file(uri):
+    return urllib.parse.unquote(uri[len("file:"):].split("?", 1)[0])
+
+#Drops every cached snapshot and deletes their files
+def clear():
+    global _workDir
+    for connection in _keepAlive.values():
+        connection.close()
+    _keepAlive.clear()
+    _snapshots.clear()
+    _builds.clear()
+    if _workDir is not None:
+        shutil.rmtree(_workDir, ignore_errors=True)
+        _workDir = None
+
+atexit.register(clear)
+
+#Forgets the snapshots inherited from a parent process without closing or
+#deleting them, so a forked worker builds its own in a directory of its own
+#and never removes the parent's
+def forget():
+    global _workDir
+    _keepAlive.clear()
+    _snapshots.clear()
+    _builds.clear()
+    _workDir = None
@@ -0,0 +1,125 @@
+import math
+import random
+import statistics
+
+#--------------------------------------------------------
+#                  LATENCY STATISTICS
+#--------------------------------------------------------
+#Summaries of per-run latencies. Inputs are sequences of integer nanoseconds
+#(the array('q') stored in each benchmark result); outputs stay in
+#nanoseconds so nothing is rounded until it is printed.
+
+BOOTSTRAP_RESAMPLES = 1000
+CONFIDENCE = 0.95
+
+#Above this many values the bootstrap (resamples x n) is too slow to run on
+#every summary, and the order statistic interval below is just as good
+BOOTSTRAP_LIMIT = 10000
+
+#Percentile of already sorted values, interpolating linearly between the two
+#nearest ranks. p is between 0 and 100.
+def percentile(sortedValues, p):
+    if not sortedValues:
+        return 0.0
+    rank = (len(sortedValues) - 1) * p / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(sortedValues[low])
+    return sortedValues[low] + (sortedValues[high] - sortedValues[low]) * (rank - low)
+
+def median(values):
+    return percentile(sorted(values), 50)
+
+#Sample standard deviation
+def stddev(values):
+    if len(values) < 2:
+        return 0.0
+    average = sum(values) / len(values)
+    return math.sqrt(sum((v - average) ** 2 for v in values) / (len(values) - 1))
+
+#Percentile bootstrap confidence interval of statistic (default: the median).
+#Seeded so the same latencies always give the same interval.
+def bootstrap_ci(values, statistic=median, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=0):
+    if len(values) < 2:
+        value = float(values[0]) if values else 0.0
+        return value, value
+
+    rng = random.Random(seed)
+    values = list(values)
+    estimates = sorted(statistic(rng.choices(values, k=len(values))) for _ in range(resamples))
+    tail = (1 - confidence) / 2 * 100
+    return percentile(estimates, tail), percentile(estimates, 100 - tail)
+
+#Distribution-free confidence interval of the median of already sorted
+#values: the ranks n/2 -/+ z*sqrt(n)/2, from the normal approximation to the
+#binomial. Only a sort is needed, so it suits millions of values.
+def median_ci(sortedValues, confidence=CONFIDENCE):
+    n = len(sortedValues)
+    if n < 2:
+        value = float(sortedValues[0]) if sortedValues else 0.0
+        return value, value
+    spread = statistics.NormalDist().inv_cdf(0.5 + confidence / 2) * math.sqrt(n) / 2
+    low = max(0, math.floor(n / 2 - spread) - 1)
+    high = min(n - 1, math.ceil(n / 2 + spread))
+    return float(sortedValues[low]), float(sortedValues[high])
+
+#Width of the median's confidence interval relative to the median, e.g. 0.05
+#when the interval spans 5% of it; from median_ci, so it is cheap enough to
+#check while runs are still being taken
+def relative_ci_width(sortedValues, confidence=CONFIDENCE):
+    middle = percentile(sortedValues, 50)
+    if middle <= 0:
+        return math.inf
+    low, high = median_ci(sortedValues, confidence)
+    return (high - low) / middle
+
+#Everything the report shows for one (database, scenario) cell
+def summarize(values):
+    ordered = sorted(values)
+    ciLow, ciHigh = bootstrap_ci(ordered) if len(ordered) <= BOOTSTRAP_LIMIT else median_ci(ordered)
+    return {
+        "count": len(ordered),
+        "min": float(ordered[0]) if ordered else 0.0,
+        "median": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": float(ordered[-1]) if ordered else 0.0,
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "stddev": stddev(ordered),
+        "ci_low": ciLow,
+        "ci_high": ciHigh,
+    }
+
+#Two-sided Mann-Whitney U test of whether two samples come from the same
+#distribution, with no assumption about its shape (latencies are rarely
+#normal). Uses the normal approximation with tie and continuity correction,
+#which is accurate from about 10 values per sample. Returns (U of a, p).
+def mann_whitney(a, b):
+    n1 = len(a)
+    n2 = len(b)
+    if n1 == 0 or n2 == 0:
+        return 0.0, 1.0
+
+    #Rank everything together, giving tied values the mean of their ranks
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    rankSum = 0.0
+    tieTerm = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        rankSum += rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 0)
+        ties = j - i + 1
+        tieTerm += ties ** 3 - ties
+        i = j + 1
+
+    u = rankSum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tieTerm / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, 2 * (1 - statistics.NormalDist().cdf(max(z, 0.0))))
@@ -0,0 +1,234 @@
+import argparse
+import bisect
+import itertools
+import math
+import os
+import random
+import sqlite3
+import time
+
+import benchmark
+import load_olist
+import variants
+
+#--------------------------------------------------------
+#                  SYNTHETIC DATA GENERATOR
+#--------------------------------------------------------
+#Writes Customers/Orders/Order_items/Sellers with the A3 schema at any size,
+#streaming rows straight into SQLite, so latency can be plotted against row
+#count instead of the three fixed databases.
+#
+#Keys are zero-padded hex counters, so every table is filled in primary key
+#order and its index is appended to rather than split at random; this is
+#what keeps 1e7-1e8 row builds practical.
+
+#Items per order
+#   geometric:P - 1 + Geometric(P) items; geometric:0.85 is close to Olist
+#   poisson:L   - 1 + Poisson(L) items
+#   fixed:N     - always N items
+#   none        - no items, for Q1-only scaling runs
+DEFAULT_ITEMS = "geometric:0.85"
+
+DEFAULT_SETTINGS = {
+    "customers_per_order": 1.0,   #Olist has one customer_id per order
+    "postal_codes": 15000,        #distinct customer/seller postal codes
+    "postal_skew": 0.0,           #zipf exponent of postal code popularity; 0 is uniform
+    "orders_per_seller": 30,
+    "products": 30000,
+    "items": DEFAULT_ITEMS,
+    "seed": 0,
+}
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+
+BATCH = 50000
+
+def key(i):
+    return "{:032x}".format(i)
+
+#Returns function(rng) -> number of items in one order
+def items_distribution(spec):
+    kind, _, value = spec.partition(":")
+    if kind == "none":
+        return lambda rng: 0
+    if kind == "fixed":
+        count = int(value)
+        return lambda rng: count
+    if kind == "geometric":
+        p = float(value)
+        if not 0 < p <= 1:
+            raise ValueError("geometric P must be in (0, 1]")
+        if p == 1:
+            return lambda rng: 1
+        return lambda rng: 1 + int(math.log(1 - rng.random()) / math.log(1 - p))
+    if kind == "poisson":
+        lam = float(value)
+        def poisson(rng):
+            #Knuth's method; fine for the small means used here
+            limit = math.exp(-lam)
+            count = 0
+            product = rng.random()
+            while product > limit:
+                count += 1
+                product *= rng.random()
+            return 1 + count
+        return poisson
+    raise ValueError("unknown items distribution {!r}".format(spec))
+
+#Returns function(rng) -> postal code, uniform or zipf over count codes
+def postal_distribution(count, skew):
+    codes = list(range(1000, 1000 + count))
+    if skew <= 0:
+        return lambda rng: codes[rng.randrange(count)]
+    cumulative = list(itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, count + 1)))
+    return lambda rng: codes[bisect.bisect_left(cumulative, rng.random() * cumulative[-1])]
+
+#Inserts rows from a generator in batches and returns how many there were
+def insert_stream(connection, table, width, rows):
+    insert = 'INSERT INTO "{}" VALUES ({})'.format(table, ", ".join("?" * width))
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH))
+        if not batch:
+            return count
+        connection.executemany(insert, batch)
+        count += len(batch)
+
+#Writes a database with the given number of orders to path and returns
+#per-table reports. Settings are any of DEFAULT_SETTINGS.
+def generate(path, orders, **settings):
+    config = dict(DEFAULT_SETTINGS)
+    config.update(settings)
+    rng = random.Random(config["seed"])
+    customers = max(1, int(orders * config["customers_per_order"]))
+    sellers = max(1, orders // config["orders_per_seller"])
+    postal = postal_distribution(config["postal_codes"], config["postal_skew"])
+    itemCount = items_distribution(config["items"])
+
+    def customer_rows():
+        for i in range(customers):
+            yield (key(i), postal(rng))
+
+    def seller_rows():
+        for i in range(sellers):
+            yield (key(i), postal(rng))
+
+    #Each customer gets one order first, so none is left without, then the
+    #rest are spread at random
+    def order_rows():
+        for i in range(orders):
+            yield (key(i), key(i if i < customers else rng.randrange(customers)))
+
+    def item_rows():
+        for i in range(orders):
+            for item in range(1, itemCount(rng) + 1):
+                yield (key(i), item, key(rng.randrange(config["products"])), key(rng.randrange(sellers)))
+
+    connection = sqlite3.connect(path)
+    connection.isolation_level = None
+    variants.set_build_pragmas(connection)
+    reports = []
+    try:
+        connection.execute("BEGIN")
+        for table, width, rows in [("Customers", 2, customer_rows()), ("Sellers", 2, seller_rows()),
+                                   ("Orders", 2, order_rows()), ("Order_items", 4, item_rows())]:
+            start = time.perf_counter()
+            connection.execute(load_olist.SCHEMA[table])
+            count = insert_stream(connection, table, width, rows)
+            seconds = time.perf_counter() - start
+            reports.append({"table": table, "rows": count, "seconds": seconds,
+                            "rows_per_s": count / seconds if seconds > 0 else 0.0})
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+    return reports
+
+#Name of the generated database for a size and settings, so a database is
+#only generated once for the same inputs
+def database_name(orders, settings):
+    config = dict(DEFAULT_SETTINGS)
+    config.update(settings)
+    tag = "-".join("{}".format(config[name]) for name in sorted(config)).replace(":", "").replace(".", "_")
+    return "synth-{}-{}.db".format(orders, tag)
+
+#Generates the database at path unless it already exists. It is written to
+#path + ".tmp" and renamed when complete, so an interrupted run never leaves
+#a half-written database under the final name.
+def ensure_database(path, orders, settings):
+    if os.path.exists(path):
+        print("Reusing {}".format(path))
+        return
+    print("Generating {} orders into {}".format(orders, path))
+    if os.path.exists(path + ".tmp"):
+        os.remove(path + ".tmp")
+    for report in generate(path + ".tmp", orders, **settings):
+        print("    {:<12} {:>11} rows in {:.3f}s ({:,.0f} rows/s)".format(
+            report["table"], report["rows"], report["seconds"], report["rows_per_s"]))
+    os.replace(path + ".tmp", path)
+
+#Generates (or reuses) a database per size, benchmarks the queries on each
+#and returns the results, each with its "rows" (orders) count
+def run_scaling(queries, sizes, directory, scenarios=benchmark.DEFAULT_SCENARIOS, runs=benchmark.DEFAULT_RUNS,
+                options=None, settings=None):
+    settings = settings or {}
+    paths = {}
+    for orders in sizes:
+        path = os.path.join(directory, database_name(orders, settings))
+        ensure_database(path, orders, settings)
+        paths[path] = orders
+
+    results = benchmark.run(queries, list(paths), scenarios, runs, options)
+    for result in results:
+        result["rows"] = paths[result["db"]]
+    return results
+
+def parse_sizes(text):
+    return [int(float(size)) for size in text.split(",")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic A3 databases and plot latency against size")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                        help="comma separated order counts, e.g. 1e3,1e4,1e5 (up to 1e8)")
+    parser.add_argument("--out-dir", default=".", help="where generated databases are kept")
+    parser.add_argument("--query", action="append", help="query name, e.g. Q1 (default: all)")
+    parser.add_argument("--scenario", action="append", help="scenario name (default: the standard ones)")
+    parser.add_argument("--runs", type=int, default=benchmark.DEFAULT_RUNS)
+    parser.add_argument("--postal-codes", type=int, default=DEFAULT_SETTINGS["postal_codes"])
+    parser.add_argument("--postal-skew", type=float, default=DEFAULT_SETTINGS["postal_skew"])
+    parser.add_argument("--items", default=DEFAULT_SETTINGS["items"],
+                        help="items per order: geometric:P, poisson:L, fixed:N or none")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SETTINGS["seed"])
+    parser.add_argument("--generate-only", action="store_true", help="only write the databases")
+    parser.add_argument("--chart", help="also draw the scaling chart to this file (or later: python report.py)")
+    args = parser.parse_args(argv)
+
+    settings = {"postal_codes": args.postal_codes, "postal_skew": args.postal_skew,
+                "items": args.items, "seed": args.seed}
+    if args.generate_only:
+        for orders in args.sizes:
+            ensure_database(os.path.join(args.out_dir, database_name(orders, settings)), orders, settings)
+        return 0
+
+    queries = benchmark.load_queries()
+    names = args.query or list(queries)
+    for name in names:
+        if name not in queries:
+            parser.error("unknown query {} (known: {})".format(name, ", ".join(queries)))
+    undeclared = benchmark.undeclared_scenarios([queries[name] for name in names],
+                                                args.scenario or benchmark.DEFAULT_SCENARIOS)
+    if undeclared:
+        parser.error("unknown scenario: {}; pick the queries with --query".format("; ".join(undeclared)))
+    results = run_scaling([queries[name] for name in names], args.sizes, args.out_dir,
+                          args.scenario or benchmark.DEFAULT_SCENARIOS, args.runs, settings=settings)
+    benchmark.print_results(results)
+
+    import history
+    history.save(results, label="scaling")
+    if args.chart:
+        import plots
+        plots.scaling_curve(results, "Latency against database size", args.chart)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+import benchmark
+
+#--------------------------------------------------------
+#                  BATCH STATEMENT ANSWERS
+#--------------------------------------------------------
+#Every query's batch_sql must return one row per parameter id, holding the
+#answer its per-parameter sql gives - including parameters that match
+#nothing, which an inner join on Params would drop. Checked on a tiny
+#database built here, for each query's own SQL and for the scenarios that
+#answer it with SQL of their own (Summary, Precomputed).
+
+SCHEMA = [
+    'CREATE TABLE "Customers" ("customer_id" TEXT, "customer_postal_code" INTEGER, PRIMARY KEY("customer_id"))',
+    '''CREATE TABLE "Orders" ("order_id" TEXT, "customer_id" TEXT,
+       FOREIGN KEY("customer_id") REFERENCES "Customers"("customer_id"), PRIMARY KEY("order_id"))''',
+    '''CREATE TABLE "Order_items" ("order_id" TEXT, "order_item_id" INTEGER, "product_id" TEXT, "seller_id" TEXT,
+       FOREIGN KEY("order_id") REFERENCES "Orders"("order_id"),
+       PRIMARY KEY("order_id", "order_item_id", "product_id", "seller_id"))''',
+    'CREATE TABLE "Sellers" ("seller_id" TEXT, "seller_postal_code" INTEGER, PRIMARY KEY("seller_id"))',
+]
+
+#c4 has no orders, o4 no items, seller s3 is missing and postal code 999
+#and order o9 do not exist
+ROWS = {
+    "Customers": [("c1", 100), ("c2", 100), ("c3", 200), ("c4", 300)],
+    "Orders": [("o1", "c1"), ("o2", "c1"), ("o3", "c2"), ("o4", "c3")],
+    "Order_items": [("o1", 1, "p1", "s1"), ("o1", 2, "p2", "s2"), ("o1", 2, "p3", "s2"),
+                    ("o2", 1, "p1", "s1"), ("o3", 1, "p1", "s3")],
+    "Sellers": [("s1", 10), ("s2", 20)],
+}
+
+PARAMS = {
+    "code": [{"code": code} for code in [100, 200, 300, 999, 100]],
+    "orderID": [{"orderID": order} for order in ["o1", "o2", "o3", "o4", "o9"]],
+}
+
+def cases():
+    return [pytest.param(query, scenarioSpec, id="{}-{}".format(query["name"], scenarioName))
+            for query in benchmark.load_queries().values()
+            for scenarioName, scenarioSpec in query["scenarios"].items()
+            if scenarioName == "UserOptimized" or scenarioSpec.get("sql")]
+
+def build(statements):
+    connection = sqlite3.connect(":memory:")
+    for statement in SCHEMA:
+        connection.execute(statement)
+    for table, rows in ROWS.items():
+        connection.executemany('INSERT INTO "{}" VALUES ({})'.format(table, ", ".join("?" * len(rows[0]))), rows)
+    for statement in statements:
+        connection.execute(statement)
+    return connection
+
+def rounded(rows):
+    return [tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in rows]
+
+@pytest.mark.parametrize("query, scenarioSpec", cases())
+def test_batch_matches_each_parameter(query, scenarioSpec):
+    query = benchmark.scenario_query(query, scenarioSpec)
+    connection = build(scenarioSpec["setup"] + query["setup"])
+    params = PARAMS["code" if ":code" in query["sql"] else "orderID"]
+    try:
+        expected = [rounded(connection.execute(query["sql"], p).fetchall())[0] for p in params]
+        sql, args = benchmark.batch_statement(query, params)
+        batch = {row[0]: row[1:] for row in rounded(connection.execute(sql, args).fetchall())}
+    finally:
+        connection.close()
+    assert sorted(batch) == list(range(len(params)))
+    assert [batch[i] for i in range(len(params))] == expected
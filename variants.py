@@ -0,0 +1,111 @@
+import os
+import time
+
+#--------------------------------------------------------
+#                  SCHEMA VARIANT BUILDER
+#--------------------------------------------------------
+#Builds the "uninformed" copies of tables: identical columns, no primary key
+#and so no automatic index. Only ever run on a snapshot (see snapshots.py),
+#where durability does not matter, so journaling and syncing are turned off
+#and the whole build is one transaction.
+
+#Pragmas set on the snapshot connection while it is being built. A negative
+#cache_size is in KiB, so this is 256 MiB.
+BUILD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+}
+
+#Rows per executemany() call when streaming
+DEFAULT_BATCH = 50000
+
+def set_build_pragmas(connection):
+    for name, value in BUILD_PRAGMAS.items():
+        connection.execute("PRAGMA {}={}".format(name, value))
+
+#Physical memory in bytes, or None where it cannot be found
+def physical_memory():
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+#Approximate size of a table in bytes, from dbstat where it is compiled in,
+#otherwise the size of the whole database
+def table_bytes(connection, table):
+    try:
+        row = connection.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (table,)).fetchone()
+        if row[0] is not None:
+            return row[0]
+    except Exception:
+        pass
+    pageCount = connection.execute("PRAGMA page_count").fetchone()[0]
+    pageSize = connection.execute("PRAGMA page_size").fetchone()[0]
+    return pageCount * pageSize
+
+#Tables larger than half of RAM are streamed through Python in batches rather
+#than copied with one INSERT ... SELECT
+def should_stream(connection, table):
+    memory = physical_memory()
+    return memory is not None and table_bytes(connection, table) > memory // 2
+
+#Replaces table with a copy holding the same rows but no keys, inside one
+#transaction, and returns a report of the build
+#   columns - [(name, type), ...] of the copy
+#   stream  - True/False to force a method; None decides by table size
+def build_unkeyed(connection, table, columns, stream=None, batchSize=DEFAULT_BATCH):
+    columnList = ", ".join('"{}"'.format(name) for name, _ in columns)
+    columnDefs = ", ".join('"{}" {}'.format(name, kind) for name, kind in columns)
+    if stream is None:
+        stream = should_stream(connection, table)
+
+    #Manage the transaction ourselves so it really is just one
+    isolation = connection.isolation_level
+    connection.isolation_level = None
+    start = time.perf_counter()
+    try:
+        connection.execute("BEGIN")
+        connection.execute('CREATE TABLE "{}New" ({})'.format(table, columnDefs))
+        if stream:
+            rows = 0
+            reader = connection.execute('SELECT {} FROM "{}"'.format(columnList, table))
+            insert = 'INSERT INTO "{}New" VALUES ({})'.format(table, ", ".join("?" * len(columns)))
+            while True:
+                batch = reader.fetchmany(batchSize)
+                if not batch:
+                    break
+                connection.executemany(insert, batch)
+                rows += len(batch)
+        else:
+            rows = connection.execute('INSERT INTO "{0}New" SELECT {1} FROM "{0}"'.format(table, columnList)).rowcount
+        connection.execute('DROP TABLE "{}"'.format(table))
+        connection.execute('ALTER TABLE "{0}New" RENAME TO "{0}"'.format(table))
+        connection.execute("COMMIT")
+    except Exception:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.isolation_level = isolation
+    seconds = time.perf_counter() - start
+
+    return {
+        "table": table,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_s": rows / seconds if seconds > 0 else 0.0,
+        "streamed": stream,
+    }
+
+def print_build(report, indent="        "):
+    if "statement" in report:
+        statement = report["statement"]
+        if len(statement) > 100:
+            statement = statement[:97] + "..."
+        print(indent + "Ran {} in {:.3f}s".format(statement, report["seconds"]))
+        return
+    print(indent + "Built {} without keys: {} rows in {:.3f}s ({:,.0f} rows/s{})".format(
+        report["table"], report["rows"], report["seconds"], report["rows_per_s"],
+        ", streamed" if report["streamed"] else ""))